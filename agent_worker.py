@@ -0,0 +1,166 @@
+import time
+import queue
+import itertools
+import threading
+from collections import deque
+from reporters import JsonReporter, LIVE_OUTPUT_LINES
+
+
+class QueueReporter(JsonReporter):
+    """The JSON event stream, published on the worker's queue instead of a file.
+
+    Approvals block the flow thread until an answer arrives on the worker's control channel.
+    """
+    def __init__(self, worker):
+        super().__init__()
+        self.worker = worker
+
+    def emit(self, event, **fields):
+        self.worker.events.put({"event": event, "time": round(time.time(), 3), **fields})
+
+    def approve(self, command, trace=None, approvals=None, pending=()):
+        if approvals and approvals.is_approved(command):
+            return True
+        return self.worker.ask(command, pending, approvals, trace)
+
+    def celebrate(self):
+        self.emit("celebrate")
+
+
+class AgentWorker:
+    """Runs one flow on a background thread, so Streamlit reruns neither restart nor block it.
+
+    Progress goes out on `events` (a queue the UI drains when it polls); STOP and approval answers
+    come in on `control`.
+    """
+    def __init__(self, shared, build_flow=None):
+        if build_flow is None:
+            from flow import build_flow
+        self.build_flow = build_flow
+        self.shared = shared
+        self.events = queue.Queue()
+        self.control = queue.Queue()
+        self.request_ids = itertools.count(1)
+        self.error = None
+        self.cancel_event = shared.get("cancel_event") or threading.Event()
+        shared["cancel_event"] = self.cancel_event
+        shared["reporter"] = QueueReporter(self)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
+
+    def _run(self):
+        try:
+            self.build_flow().run(self.shared)
+        except Exception as e:
+            self.error = e
+            self.events.put({"event": "error", "time": round(time.time(), 3), "text": f"{type(e).__name__}: {e}"})
+        finally:
+            self.events.put({"event": "finished", "time": round(time.time(), 3)})
+
+    def stop(self):
+        """Takes effect right away: a running command is killed and a pending approval is denied."""
+        self.cancel_event.set()
+        if self.shared.get("plan_stream"):
+            self.shared["plan_stream"].cancel()
+        self.control.put({"action": "stop"})
+
+    def answer(self, request_id, decision):
+        """`decision` is "approve", "approve_all" or "deny"."""
+        self.control.put({"action": decision, "id": request_id})
+
+    def ask(self, command, pending, approvals, trace):
+        """Called on the flow thread: publishes the prompt and waits for its answer."""
+        request_id = next(self.request_ids)
+        self.events.put({"event": "approval_required", "time": round(time.time(), 3), "id": request_id, "command": command, "pending": list(pending)})
+        started = time.time()
+        decision = "deny"
+        while not self.cancel_event.is_set():
+            try:
+                message = self.control.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if message["action"] == "stop":
+                break
+            if message.get("id") == request_id:  # a late click on an older prompt is ignored
+                decision = message["action"]
+                break
+        if trace: trace.record("approval", command=command, seconds=round(time.time() - started, 3))
+        self.events.put({"event": "approval_resolved", "time": round(time.time(), 3), "id": request_id, "decision": decision})
+        if approvals and decision == "approve_all":
+            approvals.approve(command, *pending)
+        elif approvals and decision == "approve":
+            approvals.approve(command)
+        return decision in ("approve", "approve_all")
+
+
+class RunView:
+    """What the UI shows for the running flow, folded together from the worker's events.
+
+    Only touched from the UI thread. Conversation messages are collected in `messages` and moved
+    into the chat history once the run is over.
+    """
+    def __init__(self):
+        self.items = []
+        self.statuses = {}
+        self.commands = {}
+        self.messages = []
+        self.approval = None
+        self.celebrate = False
+        self.finished = False
+
+    def drain(self, worker, limit=2000):
+        """Applies whatever the worker published since the last poll. Returns True if anything changed."""
+        changed = False
+        for _ in range(limit):
+            try:
+                event = worker.events.get_nowait()
+            except queue.Empty:
+                break
+            self.apply(event)
+            changed = True
+        return changed
+
+    def apply(self, event):
+        kind = event["event"]
+        if kind == "message":
+            self.messages.append({"role": "assistant", "content": event["text"]})
+            self.items.append({"type": "message", "text": event["text"], "level": event.get("level", "info")})
+        elif kind in ("notice", "error"):
+            self.items.append({"type": "notice", "text": event["text"], "level": event.get("level", "error" if kind == "error" else "info")})
+        elif kind == "status":
+            status = self.statuses.get(event["id"])
+            if status is None:
+                status = self.statuses[event["id"]] = {"type": "status", "label": event["label"], "lines": [], "state": "running", "expanded": True}
+                self.items.append(status)
+            if "text" in event:
+                status["lines"].append(event["text"])
+            for field in ("label", "state", "expanded"):
+                if field in event and not (field == "label" and "text" in event):
+                    status[field] = event[field]
+        elif kind == "command_start":
+            command = self.commands[event["command"]] = {"type": "command", "command": event["command"], "lines": deque(maxlen=LIVE_OUTPUT_LINES), "result": None}
+            self.items.append(command)
+        elif kind == "output":
+            command = self.commands.get(event["command"])
+            if command is not None:
+                command["lines"].append(event["line"] + "\n")
+        elif kind == "command_end":
+            command = self.commands.get(event["command"])
+            if command is not None:
+                command["result"] = event
+        elif kind == "approval_required":
+            self.approval = event
+        elif kind == "approval_resolved":
+            if self.approval and self.approval["id"] == event["id"]:
+                self.approval = None
+        elif kind == "celebrate":
+            self.celebrate = True
+        elif kind == "finished":
+            self.finished = True
@@ -1,36 +1,120 @@
 import streamlit as st
-import requests
-from flow import build_flow
+from router import get_router
+from prompt_builder import DEFAULT_PROMPT_BUDGET
+from workspace_index import format_size, get_index
+from metrics import RunTrace
+from fileops import session_workspace
+from agent_worker import AgentWorker, RunView
+from plan_cache import get_plan_cache
+from approvals import EXAMPLE_ALLOWLIST, parse_patterns
+from history import ChatHistory
 import os
+import re
+import uuid
 import shutil
+import threading
+from scheduler import FairScheduler
 
 def check_ollama_status():
-    try:
-        response = requests.get("http://localhost:11434/", timeout=1)
-        return response.status_code == 200
-    except (requests.ConnectionError, requests.Timeout):
-        return False
+    # Served from each client's TTL cache, so reruns don't pay for a round trip
+    return get_router().is_online()
 
 def get_ollama_models():
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
-        response.raise_for_status()
-        models = response.json().get("models", [])
-        return [model["name"] for model in models]
-    except Exception:
-        return ["gemma"]
-
-def get_workspace_files(startpath):
-    file_list = []
-    for root, dirs, files in os.walk(startpath):
-        for f in files:
-            full_path = os.path.join(root, f)
-            rel_path = os.path.relpath(full_path, startpath)
-            file_list.append((f, full_path, rel_path))
-    return file_list
+    return get_router().list_models()
+
+EXPLORER_PAGE_SIZE = 20
+LIVE_REFRESH_SECONDS = 0.5  # how often the running agent's progress is polled
+LIVE_ITEMS_WINDOW = 40  # only the newest steps of a running agent are redrawn on each poll
+HISTORY_PAGE_SIZE = 20
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,40}")
+KEEP_ALIVE_OPTIONS = {"5 minutes": "5m", "30 minutes": "30m", "2 hours": "2h", "Forever": -1}
+
+def render_metrics(summary):
+    with st.expander("📊 Run Metrics", expanded=False):
+        llm = summary["llm"]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Wall time", f"{summary['wall_seconds']:.1f}s")
+        col2.metric("Generation", f"{llm['tokens_per_s']} tok/s" if llm["tokens_per_s"] else "n/a")
+        col3.metric("Replans", summary["replans"])
+        col4.metric("Approval wait", f"{summary['approval_wait_seconds']:.1f}s")
+        st.caption(
+            f"LLM: {llm['calls']} calls · prompt eval {llm['prompt_eval_s']:.2f}s ({llm['prompt_tokens']} tok) · "
+            f"generation {llm['eval_s']:.2f}s ({llm['eval_tokens']} tok) · model load {llm['load_s']:.2f}s · "
+            f"healer {summary['healer_seconds'] * 1000:.1f}ms · breaker trips {summary['circuit_breaker_trips']} · "
+            f"approvals {summary['approvals']['prompts']} asked / {summary['approvals']['auto']} auto · "
+            f"files {format_size(summary['file_io']['bytes_written'])} written of {format_size(summary['file_io']['bytes_requested'])} "
+            f"({summary['file_io']['unchanged']} unchanged)"
+        )
+        st.markdown("**Per node**")
+        st.table([{"node": name, **stats} for name, stats in summary["nodes"].items()])
+        if summary["tasks"]:
+            st.markdown("**Per action**")
+            st.table([{"action": name, **stats} for name, stats in summary["tasks"].items()])
+        if len(summary["endpoints"]) > 1 or summary["hedges_won"]:
+            st.caption("Endpoints: " + " · ".join(f"{url} ({calls})" for url, calls in summary["endpoints"].items()) + f" · hedges won {summary['hedges_won']}")
+        st.caption(f"Trace: `{summary['run_id']}.jsonl`")
+
+def open_workspace_dir(rel):
+    st.session_state.explorer_dir = rel
+    st.session_state.explorer_page = 0
+
+def turn_explorer_page(delta):
+    st.session_state.explorer_page = max(0, st.session_state.get("explorer_page", 0) + delta)
+
+def turn_history_page(delta):
+    st.session_state.history_page = max(0, st.session_state.get("history_page", 0) + delta)
+
+def finish_run(closing_message=None):
+    """Collapses the run into one summary card in the chat history and unlocks the input."""
+    view = st.session_state.run_view
+    view.drain(st.session_state.worker)
+    shared = st.session_state.worker.shared
+    trace = shared.get("trace")
+    st.session_state.history.add_run(view.messages, goal=shared.get("user_goal"), summary=trace.summary() if trace else None, outcome=closing_message)
+    view.messages = []
+    st.session_state.history_page = 0
+    st.session_state.agent_running = False
+
+def render_history_message(history, entry):
+    st.markdown(entry["content"])
+    # Spilled to disk: read back only while the toggle is on
+    if entry["full"] and st.toggle("📄 Show everything", key=f"full_{entry['id']}"):
+        st.markdown(history.full_text(entry))
+
+def render_history_entry(history, entry):
+    with st.chat_message(entry["role"]):
+        if entry["type"] != "run":
+            render_history_message(history, entry)
+            return
+        st.markdown(entry["headline"])
+        details = [f"{len(entry['steps'])} steps"]
+        if entry["failures"]:
+            details.append(f"{entry['failures']} failed")
+        if entry["replans"]:
+            details.append(f"{entry['replans']} replans")
+        if entry["seconds"] is not None:
+            details.append(f"{entry['seconds']:.1f}s")
+        st.caption(" · ".join(details))
+        if entry["steps"] and st.toggle("🔍 Show steps", key=f"steps_{entry['id']}"):
+            for step in entry["steps"]:
+                render_history_message(history, step)
+
+def current_session_id():
+    """Kept in the URL, so a reload (or a bookmark) comes back to the same workspace."""
+    sid = st.query_params.get("session", "")
+    if not SESSION_ID_PATTERN.fullmatch(sid):
+        sid = uuid.uuid4().hex[:12]
+        st.query_params["session"] = sid
+    return sid
 
 st.set_page_config(page_title="PocketFlow Web Agent", page_icon="🤖")
 
+# Every browser session shares the model servers: at most OLLAMA_MAX_CONCURRENCY generations run
+# on each at once and the rest wait their turn, round-robin by session
+for client in get_router().clients():
+    if client.limiter is None:
+        client.set_limiter(FairScheduler(int(os.environ.get("OLLAMA_MAX_CONCURRENCY") or 2)))
+
 st.markdown("""
     <style>
         /* Prevent Streamlit from dimming/fading the screen during execution */
@@ -46,10 +130,13 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize chat history and state early
-if "messages" not in st.session_state:
-    st.session_state.messages = []
 if "agent_running" not in st.session_state:
     st.session_state.agent_running = False
+if "session_id" not in st.session_state:
+    st.session_state.session_id = current_session_id()
+if "history" not in st.session_state:
+    st.session_state.history = ChatHistory(st.session_state.session_id)
+session_ws = session_workspace(st.session_state.session_id)
 if "shared" not in st.session_state:
     st.session_state.shared = {"tasks": None, "current_index": 0}
 
@@ -58,25 +145,47 @@ with st.sidebar:
     st.header("⚙️ Agent Controls")
     
     st.subheader("📂 Workspace Explorer")
-    if not os.path.exists("workspace"):
-        os.makedirs("workspace")
 
-    files = get_workspace_files("workspace")
-    if not files:
+    # Incremental: only directories whose mtime changed since the last rerun are re-listed
+    workspace_index = get_index(session_ws)
+    workspace_index.refresh()
+    if workspace_index.is_empty():
         st.caption("Workspace is currently empty.")
     else:
         with st.expander("Show Files & Downloads", expanded=True):
-            for filename, full_path, rel_path in files:
-                st.markdown(f"📄 {rel_path}")
-                with open(full_path, "rb") as f:
-                    st.download_button("💾 Download", f, file_name=filename, key=f"dl_{rel_path}")
+            current_dir = st.session_state.get("explorer_dir", ".")
+            if current_dir not in workspace_index.dirs:
+                current_dir = "."
+            subdirs, ignored_dirs, files = workspace_index.listdir(current_dir)
+
+            st.caption(f"📁 workspace/{'' if current_dir == '.' else current_dir + '/'}")
+            if current_dir != ".":
+                st.button("⬆️ Up", key="explorer_up", on_click=open_workspace_dir, args=(os.path.dirname(current_dir) or ".",))
+            for name in subdirs:
+                child = name if current_dir == "." else f"{current_dir}/{name}"
+                st.button(f"📁 {name}/", key=f"explorer_cd_{child}", on_click=open_workspace_dir, args=(child,))
+            for name in ignored_dirs:
+                st.caption(f"📦 {name}/ (not indexed)")
+
+            pages = max(1, -(-len(files) // EXPLORER_PAGE_SIZE))
+            page = min(st.session_state.get("explorer_page", 0), pages - 1)
+            for name, size in files[page * EXPLORER_PAGE_SIZE:(page + 1) * EXPLORER_PAGE_SIZE]:
+                rel_path = name if current_dir == "." else f"{current_dir}/{name}"
+                st.markdown(f"📄 {name} · {format_size(size)}")
+                # The callable is only run when the button is clicked, so no bytes are read on rerun
+                st.download_button("💾 Download", workspace_index.reader(rel_path), file_name=name, key=f"dl_{rel_path}")
+            if pages > 1:
+                prev_col, label_col, next_col = st.columns([0.3, 0.4, 0.3])
+                prev_col.button("◀", key="explorer_prev", disabled=page == 0, on_click=turn_explorer_page, args=(-1,))
+                label_col.caption(f"Page {page + 1}/{pages}")
+                next_col.button("▶", key="explorer_next", disabled=page >= pages - 1, on_click=turn_explorer_page, args=(1,))
 
     with st.expander("🗑️ Advanced Cleanup"):
         if st.button("Delete All Workspace Files", use_container_width=True):
-            if os.path.exists("workspace"):
+            if os.path.exists(session_ws):
                 # Instead of deleting the folder, we delete its contents
-                for filename in os.listdir("workspace"):
-                    file_path = os.path.join("workspace", filename)
+                for filename in os.listdir(session_ws):
+                    file_path = os.path.join(session_ws, filename)
                     try:
                         if os.path.isfile(file_path) or os.path.islink(file_path):
                             os.unlink(file_path) # Delete file or link
@@ -86,12 +195,14 @@ with st.sidebar:
                         st.error(f"Failed to delete {file_path}. Reason: {e}")
                 
                 # Re-ensure .gitignore exists so the workspace stays clean in Git
-                gitignore_path = os.path.join("workspace", ".gitignore")
+                gitignore_path = os.path.join(session_ws, ".gitignore")
                 with open(gitignore_path, "w") as f:
                     f.write("*\n!.gitignore\n")
             st.rerun()
 
     st.subheader("🔌 System Status")
+    if st.button("🔄 Recheck Server", use_container_width=True):
+        get_router().refresh()
     server_online = check_ollama_status()
     
     if server_online:
@@ -100,10 +211,42 @@ with st.sidebar:
     else:
         st.error("🔴 Ollama Server: **Offline**")
         available_models = ["gemma"]
+    endpoints = get_router().snapshot()["endpoints"]
+    if len(endpoints) > 1:
+        for endpoint in endpoints:
+            latency = f" · ~{endpoint['latency']:.1f}s" if endpoint["latency"] is not None else ""
+            st.caption(f"{'🟢' if endpoint['healthy'] else '🔴'} {endpoint['url']} · {endpoint['in_flight']} running · {endpoint['calls']} calls{latency}")
 
     st.divider()
     st.subheader("🧠 Intelligence")
     selected_model = st.selectbox("Select an LLM:", available_models, disabled=not server_online)
+    keep_alive = KEEP_ALIVE_OPTIONS[st.selectbox("🔥 Keep the model loaded for", list(KEEP_ALIVE_OPTIONS), index=1)]
+    if server_online:
+        # Load the model in the background now, so the first plan doesn't pay for it
+        get_router().warm_up(selected_model, keep_alive)
+    stream_plan = st.toggle("📡 Stream plan (start tasks before the plan is finished)", value=True)
+    hedge_after = st.number_input(
+        "🏎️ Hedge slow plans after (seconds, 0 = off)", min_value=0.0, max_value=600.0, value=0.0, step=5.0, disabled=stream_plan,
+        help="If no plan has arrived by then, the same prompt also goes to another server (or the model below) and the first valid plan wins. Only for non-streamed plans.",
+    )
+    hedge_model = st.selectbox("Hedge with", ["Same model"] + [m for m in available_models if m != selected_model], disabled=stream_plan or not hedge_after)
+    parallel_workers = st.slider("⚡ Parallel file operations", min_value=1, max_value=8, value=4)
+    cmd_timeout = st.number_input("⏱️ Command timeout (seconds)", min_value=10, max_value=7200, value=600, step=30)
+    persistent_shell = st.toggle("🐚 One shell session per run", value=False, help="cd, exported variables and an activated venv carry over to the next run_cmd (Linux/macOS)")
+    allowlist = st.text_area(
+        "✅ Auto-approve commands matching",
+        placeholder="\n".join(EXAMPLE_ALLOWLIST),
+        help="One shell-style pattern per line, e.g. `pip install *`. Matching run_cmd steps skip the approval prompt. Chained commands (`;`, `&&`, `|`) only match patterns that spell the operator out.",
+        key="allowlist_text",
+    )
+    prompt_budget = st.number_input("🧮 Prompt token budget", min_value=500, max_value=32000, value=DEFAULT_PROMPT_BUDGET, step=500)
+    structured_output = st.toggle("🧷 Constrain output with a JSON schema", value=False, help="Sends the plan schema as Ollama's `format`, so the model can only produce valid tasks (needs Ollama 0.5+)")
+    use_plan_cache = st.toggle("♻️ Reuse cached plans", value=True, help="Off forces a fresh generation for every goal")
+    cache_stats = get_plan_cache().summary()
+    st.caption(
+        f"Plan cache: {cache_stats['disk_entries']} plans · {format_size(cache_stats['disk_bytes'])} · "
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses since the server started (all sessions)"
+    )
 
     st.divider()
     st.subheader("🧹 Cleanup")
@@ -111,69 +254,159 @@ with st.sidebar:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("💬 Clear Chat", use_container_width=True):
-            st.session_state.messages = []
+            st.session_state.history.clear()
+            st.session_state.history_page = 0
             st.rerun()
             
     with col2:
         if st.button("🧠 Clear History", use_container_width=True):
+            if st.session_state.get("worker"):
+                st.session_state.worker.stop()
             st.session_state.agent_running = False
+            if st.session_state.shared.get("shell_session"):
+                st.session_state.shared["shell_session"].close()
             st.session_state.shared = {"tasks": None, "current_index": 0}
-            for key in list(st.session_state.keys()):
-                if key.startswith("approve_") or key.startswith("deny_"):
-                    del st.session_state[key]
             st.rerun()
 
+    if st.button("♻️ Clear Plan Cache", use_container_width=True):
+        get_plan_cache().clear()
+        st.rerun()
+
 # --- MAIN UI ---
 st.title("🤖 PocketFlow Agent (Claude Code Style)")
 
-# Display chat messages from history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+# Display chat messages from history, one page at a time so a rerun costs the same however long
+# the session gets (page 0 is the newest)
+history = st.session_state.history
+history_pages = history.pages(HISTORY_PAGE_SIZE)
+history_page = min(st.session_state.get("history_page", 0), history_pages - 1)
+if history_page < history_pages - 1:
+    st.button(f"⬆️ Older messages ({history_pages - history_page - 1} more pages)", key="history_older", on_click=turn_history_page, args=(1,))
+for entry in history.page(history_page, HISTORY_PAGE_SIZE):
+    render_history_entry(history, entry)
+if history_page > 0:
+    st.button("⬇️ Newer messages", key="history_newer", on_click=turn_history_page, args=(-1,))
+
+# Where did the last run's time go?
+if st.session_state.shared.get("trace") and not st.session_state.agent_running:
+    render_metrics(st.session_state.shared["trace"].summary())
 
 # Accept user input
 if server_online:
     if prompt := st.chat_input("Enter your goal (e.g., 'Write a Python script to ping Google')"):
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        if st.session_state.agent_running and st.session_state.get("worker"):
+            st.session_state.worker.stop()
+            finish_run("🛑 **Execution stopped by user.**")
+        st.session_state.history.add("user", prompt)
+        st.session_state.history_page = 0
         
-        # Reset the shared state for a fresh run
-        st.session_state.shared.update({
+        # Reset the shared state for a fresh run (a new dict, so a worker that is still
+        # winding down can't write into it)
+        st.session_state.shared = dict(st.session_state.shared, **{
             "user_goal": prompt,
+            "session_id": st.session_state.session_id,
+            "workspace": session_ws,
             "tasks": None,
             "current_index": 0,
             "model": selected_model,
-            "error_feedback": None 
+            "stream_plan": stream_plan,
+            "hedge_after": hedge_after or None,
+            "hedge_model": None if hedge_model == "Same model" else hedge_model,
+            "parallel_workers": parallel_workers,
+            "cmd_timeout": cmd_timeout,
+            "cancel_event": threading.Event(),
+            "prompt_budget": prompt_budget,
+            "use_plan_cache": use_plan_cache,
+            "structured_output": structured_output,
+            "persistent_shell": persistent_shell,
+            "allowlist": parse_patterns(allowlist),
+            "approvals": None,
+            "plan_stream": None,
+            "shell_session": None,
+            "keep_alive": keep_alive,
+            "llm_context": None,
+            "trace": RunTrace(goal=prompt, model=selected_model),
+            "observations": [],
+            "error_feedback": None,
+            "journal": []
         })
         
         st.session_state.agent_running = True
+        st.session_state.run_view = RunView()
+        st.session_state.worker = AgentWorker(st.session_state.shared).start()
         st.rerun()
 else:
     st.chat_input("Server offline. Please start Ollama first.", disabled=True)
 
 # --- Final Render Logic ---
-if st.session_state.agent_running:
-    with st.chat_message("assistant"):
-        ui_block = st.container()
-        st.session_state.shared["ui"] = ui_block
-        
-        col1, col2 = st.columns([0.8, 0.2])
-        with col2:
-            if st.button("🛑 STOP", type="primary", use_container_width=True):
-                st.session_state.agent_running = False
-                st.session_state.shared["tasks"] = None 
-                
-                stop_msg = "🛑 **Execution stopped by user.**"
-                st.session_state.messages.append({"role": "assistant", "content": stop_msg})
-                st.rerun()
+# The flow runs on a background worker; this fragment polls its events and redraws just itself,
+# so the sidebar and the chat stay usable while the agent works
+def render_run_item(item):
+    if item["type"] == "message" or item["type"] == "notice":
+        if item["level"] == "caption":
+            st.caption(item["text"])
+        elif item["level"] in ("warning", "error", "success"):
+            getattr(st, item["level"])(item["text"])
+        else:
+            st.markdown(item["text"])
+    elif item["type"] == "status":
+        with st.status(item["label"], state=item["state"], expanded=item["expanded"]):
+            for line in item["lines"]:
+                st.write(line)
+    elif item["type"] == "command":
+        res = item["result"]
+        if res is None:
+            label, state = f"🖥️ Running `{item['command']}`...", "running"
+        elif res["returncode"] == 0 and not res["timed_out"]:
+            label, state = f"✅ `{item['command']}` finished in {res['seconds']:.1f}s", "complete"
+        else:
+            label, state = f"❌ `{item['command']}` failed after {res['seconds']:.1f}s", "error"
+        with st.status(label, state=state, expanded=res is None):
+            st.code("".join(item["lines"]) or "(waiting for output...)", language="text")
 
-        try:
-            app_flow = build_flow()
-            app_flow.run(st.session_state.shared)
-            
-            # Flow finished natively! Clean up UI and lock into permanent history.
-            st.session_state.agent_running = False
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_live_run():
+    worker, view = st.session_state.worker, st.session_state.run_view
+    view.drain(worker)
+    if len(view.items) > LIVE_ITEMS_WINDOW:
+        st.caption(f"… {len(view.items) - LIVE_ITEMS_WINDOW} earlier steps (they'll be in the run's summary card)")
+    for item in view.items[-LIVE_ITEMS_WINDOW:]:
+        render_run_item(item)
+
+    position = get_router().queue_position(st.session_state.session_id)
+    if position:
+        running = sum(c.limiter.snapshot()["in_flight"] for c in get_router().clients() if isinstance(c.limiter, FairScheduler))
+        st.caption(f"⏳ In line for the model: #{position} ({running} running)")
+
+    if view.approval:
+        request = view.approval
+        st.warning(f"⚠️ **Approval Required**: Run `{request['command']}`?")
+        pending = request["pending"]
+        if len(pending) > 1:
+            st.caption("Commands in this plan:\n" + "\n".join(f"- `{c}`" for c in pending))
+        cols = st.columns(3 if len(pending) > 1 else 2)
+        cols[0].button("✅ Approve", key=f"btn_app_{request['id']}", on_click=worker.answer, args=(request["id"], "approve"))
+        if len(pending) > 1:
+            cols[1].button(f"✅ Approve all {len(pending)}", key=f"btn_app_all_{request['id']}", on_click=worker.answer, args=(request["id"], "approve_all"))
+        cols[-1].button("❌ Deny", key=f"btn_deny_{request['id']}", on_click=worker.answer, args=(request["id"], "deny"))
+
+    if view.celebrate:
+        st.balloons()
+        view.celebrate = False
+
+    col1, col2 = st.columns([0.8, 0.2])
+    with col2:
+        if st.button("🛑 STOP", type="primary", use_container_width=True):
+            # The worker kills the running command right now, not on the next rerun
+            worker.stop()
+            finish_run("🛑 **Execution stopped by user.**")
             st.rerun()
-            
-        except Exception as e:
-            st.error(f"❌ Agent Error: {e}")
-            st.session_state.agent_running = False
\ No newline at end of file
+
+    if view.finished:
+        # Flow finished natively! Lock the run into permanent history.
+        finish_run()
+        st.rerun()
+
+if st.session_state.agent_running and st.session_state.get("worker"):
+    with st.chat_message("assistant"):
+        render_live_run()
@@ -0,0 +1,52 @@
+import re
+import threading
+from fnmatch import fnmatchcase
+
+# Suggested in the UI; nothing is auto-approved unless the user turns it on
+EXAMPLE_ALLOWLIST = ["python *.py", "python3 *.py", "pip install *", "ls*", "cat *"]
+
+# A pattern like `python *.py` must not wave through `python x.py; rm -rf ~/y.py`. A newline
+# separates commands just like `;` does, so it counts as one too.
+_SHELL_OPERATORS = re.compile(r"[;&|`<>\n\r]|\$\(")
+
+
+def normalize_command(command):
+    return " ".join(str(command or "").split())
+
+
+def parse_patterns(text):
+    """One pattern per line (or a list); blank lines and # comments are skipped."""
+    lines = text.splitlines() if isinstance(text, str) else list(text or [])
+    return [normalize_command(line) for line in lines if line.strip() and not line.strip().startswith("#")]
+
+
+class ApprovalPolicy:
+    """Decides which run_cmd steps may run without a prompt.
+
+    A command runs if it matches an allowlist pattern (fnmatch, e.g. `pip install *`) or if it was
+    approved earlier in this run, one at a time or as a whole plan. Approvals are kept by command
+    text, so a replan that repeats an approved command doesn't ask again.
+    """
+    def __init__(self, patterns=None):
+        self.patterns = parse_patterns(patterns)
+        self.approved = set()
+        self.lock = threading.Lock()
+
+    def matching_pattern(self, command):
+        # Checked on the raw text: normalizing would fold a second line into the first command
+        chained = bool(_SHELL_OPERATORS.search(str(command or "")))
+        command = normalize_command(command)
+        for pattern in self.patterns:
+            if chained and not _SHELL_OPERATORS.search(pattern):
+                continue
+            if fnmatchcase(command, pattern):
+                return pattern
+        return None
+
+    def is_approved(self, command):
+        with self.lock:
+            return normalize_command(command) in self.approved
+
+    def approve(self, *commands):
+        with self.lock:
+            self.approved.update(normalize_command(c) for c in commands)
@@ -0,0 +1,166 @@
+"""Runs a file of goals concurrently, each in its own workspace, and writes per-goal results.
+
+Usage: python batch.py goals.txt [--workers 4] [--mode thread|process] [--ollama-concurrency 2] [--out runs]
+
+A .txt file holds one goal per line (blank lines and # comments are skipped). A .jsonl file holds
+objects with "goal" and optionally "id" and "model".
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+
+def load_goals(path):
+    goals = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line) if path.endswith(".jsonl") else {"goal": line}
+            item.setdefault("id", f"{len(goals) + 1:03d}-{_slug(item['goal'])}")
+            goals.append(item)
+    return goals
+
+
+def _slug(text, limit=40):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:limit] or "goal"
+
+
+def run_goal(item, out_dir, model, options):
+    """One flow run with its own workspace, trace and event log under out_dir/<id>/."""
+    # Imported here so the parent process stays light in process mode
+    from flow import build_flow
+    from metrics import RunTrace
+    from reporters import JsonReporter
+
+    run_dir = os.path.join(out_dir, item["id"])
+    os.makedirs(run_dir, exist_ok=True)
+    model = item.get("model") or model
+    started = time.time()
+    error = None
+    with open(os.path.join(run_dir, "events.jsonl"), "w") as events:
+        shared = {
+            "user_goal": item["goal"],
+            "model": model,
+            "workspace": os.path.join(run_dir, "workspace"),
+            "reporter": JsonReporter(events),
+            "trace": RunTrace(goal=item["goal"], model=model, trace_dir=run_dir),
+            **options,
+        }
+        try:
+            build_flow().run(shared)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+    summary = shared["trace"].summary()
+    result = {
+        "id": item["id"],
+        "goal": item["goal"],
+        "model": model,
+        "success": error is None and bool(shared.get("tasks")),
+        "seconds": round(time.time() - started, 3),
+        "replans": summary["replans"],
+        "tasks": len(shared.get("tasks") or []),
+        "error": error or (str(shared["error_feedback"])[:500] if shared.get("error_feedback") else None),
+        "workspace": shared["workspace"],
+        "artifacts": _list_files(shared["workspace"]),
+        "trace": shared["trace"].path,
+        "metrics": summary,
+    }
+    with open(os.path.join(run_dir, "result.json"), "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def _list_files(root):
+    files = []
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            if name != ".gitignore":
+                files.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return sorted(files)
+
+
+def _init_worker(limiters):
+    """Process workers share the parent's semaphores, so the Ollama cap holds across processes."""
+    from router import get_router
+    for client, limiter in zip(get_router().clients(), limiters):
+        client.set_limiter(limiter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("goals", help="a .txt (one goal per line) or .jsonl file")
+    parser.add_argument("--workers", type=int, default=4, help="goals run at the same time")
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread", help="threads are enough while the runs wait on Ollama; processes isolate them completely")
+    parser.add_argument("--ollama-concurrency", type=int, default=2, help="max /api/generate requests in flight per Ollama server (0 = no cap)")
+    parser.add_argument("--model", default="gemma")
+    parser.add_argument("--out", default=os.path.join("runs", time.strftime("%Y%m%d-%H%M%S")))
+    parser.add_argument("--no-stream", action="store_true", help="plan with one blocking request instead of streaming")
+    parser.add_argument("--cmd-timeout", type=float, default=600)
+    parser.add_argument("--no-cache", action="store_true", help="always ask the model instead of reusing cached plans")
+    parser.add_argument("--structured", action="store_true", help="constrain plans with the JSON Schema `format`")
+    parser.add_argument("--shell-session", action="store_true", help="run each goal's commands in one persistent shell")
+    parser.add_argument("--hedge-after", type=float, help="with --no-stream: if no plan arrived after this many seconds, also ask another server (OLLAMA_HOSTS) or --hedge-model")
+    parser.add_argument("--hedge-model", help="smaller model for hedged requests")
+    args = parser.parse_args()
+
+    goals = load_goals(args.goals)
+    os.makedirs(args.out, exist_ok=True)
+    out_dir = os.path.abspath(args.out)
+    options = {"stream_plan": not args.no_stream, "cmd_timeout": args.cmd_timeout, "use_plan_cache": not args.no_cache, "structured_output": args.structured, "persistent_shell": args.shell_session,
+               "hedge_after": args.hedge_after, "hedge_model": args.hedge_model}
+    print(f"🚀 Running {len(goals)} goals on {args.workers} {args.mode} workers (Ollama cap: {args.ollama_concurrency or 'none'}) -> {out_dir}")
+
+    # One cap per server, like the web UI: every OLLAMA_HOSTS client the router made, not just the first
+    from router import get_router
+    clients = get_router().clients() if args.ollama_concurrency else []
+    if args.mode == "process":
+        limiters = [multiprocessing.BoundedSemaphore(args.ollama_concurrency) for _ in clients]
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(limiters,))
+    else:
+        for client in clients:
+            client.set_limiter(threading.BoundedSemaphore(args.ollama_concurrency))
+        pool = ThreadPoolExecutor(max_workers=args.workers)
+
+    started = time.time()
+    results = []
+    with pool:
+        futures = {pool.submit(run_goal, item, out_dir, args.model, options): item for item in goals}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"id": item["id"], "goal": item["goal"], "success": False, "seconds": None, "replans": None, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            icon = "✅" if result["success"] else "❌"
+            seconds = f"{result['seconds']:.1f}s" if result["seconds"] is not None else "-"
+            print(f"  {icon} {result['id']:<46} {seconds:>8}  replans={result['replans']}")
+
+    wall = time.time() - started
+    results.sort(key=lambda r: r["id"])
+    succeeded = sum(r["success"] for r in results)
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump({
+            "goals": len(results),
+            "succeeded": succeeded,
+            "wall_seconds": round(wall, 3),
+            "workers": args.workers,
+            "mode": args.mode,
+            "ollama_concurrency": args.ollama_concurrency,
+            "results": [{k: v for k, v in r.items() if k != "metrics"} for r in results],
+        }, f, indent=2)
+    print(f"\n📊 {succeeded}/{len(results)} goals succeeded in {wall:.1f}s. Results in {out_dir}/summary.json")
+    sys.exit(0 if succeeded == len(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Flow benchmark: drives a corpus of goals through build_flow() against the bundled mock Ollama server.
+
+Usage: python benchmarks/bench_flow.py [--repeat 5] [--latency 0.05] [--token-delay 0.001] [--no-stream]
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_ollama import MockOllama, load_scenarios, SCENARIOS_PATH
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; good enough for a handful of runs."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # The smallest value with at least pct% of the runs at or below it
+    rank = math.ceil(pct * len(ordered) / 100)
+    return ordered[min(len(ordered), max(1, rank)) - 1]
+
+
+def reset_workspace():
+    if os.path.isdir("workspace"):
+        shutil.rmtree("workspace")
+    os.makedirs("workspace")
+
+
+def run_goal(build_flow, RunTrace, goal, options):
+    """One headless run, exactly like main.py but without input() or a UI."""
+    reset_workspace()
+    shared = {
+        "user_goal": goal,
+        "model": "mock",
+        "trace": RunTrace(goal=goal, model="mock", trace_dir=None),
+        **options,
+    }
+    start = time.perf_counter()
+    error = None
+    try:
+        build_flow().run(shared)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+    summary = shared["trace"].summary()
+    return {
+        "seconds": seconds,
+        "success": error is None and bool(shared.get("tasks")),
+        "replans": summary["replans"],
+        "llm_calls": summary["llm"]["calls"],
+        "prompt_tokens": summary["llm"]["prompt_tokens"],
+        "plan_seconds": summary["nodes"].get("PlanNode", {}).get("seconds", 0.0),
+        "plan_failures": summary["plan_failures"],
+        "healer_fallbacks": summary["healer_fallbacks"],
+        "round_trips_saved": summary["validation"]["round_trips_saved"],
+        "bytes_written": summary["file_io"]["bytes_written"],
+        "bytes_requested": summary["file_io"]["bytes_requested"],
+        "error": error,
+    }
+
+
+def run_corpus(mock, scenarios, options, repeat, check=True):
+    """Runs every scenario `repeat` times. Returns (per-scenario results, overall, mismatches)."""
+    from flow import build_flow
+    from metrics import RunTrace
+
+    results, all_runs, mismatches = [], [], 0
+    print(f"  {'scenario':<24}{'p50':>8}{'p90':>8}{'p99':>8}{'replans':>9}{'success':>9}{'prompt tok':>12}")
+    for scenario in scenarios:
+        runs = []
+        for _ in range(repeat):
+            mock.reset()
+            runs.append(run_goal(build_flow, RunTrace, scenario["goal"], options))
+        all_runs += runs
+        seconds = [r["seconds"] for r in runs]
+        success_rate = sum(r["success"] for r in runs) / len(runs)
+        replans = sum(r["replans"] for r in runs) / len(runs)
+        expected = scenario.get("expect_success")
+        ok = not check or expected is None or all(r["success"] == expected for r in runs)
+        mismatches += not ok
+        results.append({
+            "scenario": scenario.get("name", scenario["goal"]),
+            "p50": percentile(seconds, 50), "p90": percentile(seconds, 90), "p99": percentile(seconds, 99),
+            "replans_per_goal": replans, "success_rate": success_rate,
+            "llm_calls": sum(r["llm_calls"] for r in runs) / len(runs),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in runs) / len(runs),
+            "errors": sorted({r["error"] for r in runs if r["error"]}),
+        })
+        r = results[-1]
+        print(f"  {'✅' if ok else '❌'} {r['scenario']:<22}{r['p50']:>8.3f}{r['p90']:>8.3f}{r['p99']:>8.3f}{replans:>9.2f}{success_rate:>8.0%}{r['prompt_tokens']:>12.0f}")
+
+    all_seconds = [r["seconds"] for r in all_runs]
+    plan_seconds = [r["plan_seconds"] for r in all_runs]
+    llm_calls = sum(r["llm_calls"] for r in all_runs)
+    overall = {
+        "p50": percentile(all_seconds, 50), "p90": percentile(all_seconds, 90), "p99": percentile(all_seconds, 99),
+        "plan_p50": percentile(plan_seconds, 50), "plan_p90": percentile(plan_seconds, 90),
+        "replans_per_goal": sum(r["replans_per_goal"] for r in results) / len(results),
+        "success_rate": sum(r["success_rate"] for r in results) / len(results),
+        "prompt_tokens_per_goal": sum(r["prompt_tokens"] for r in results) / len(results),
+        # Share of generations that produced no usable plan, and that needed the full healer
+        "parse_failure_rate": sum(r["plan_failures"] for r in all_runs) / llm_calls if llm_calls else 0.0,
+        "healer_fallback_rate": sum(r["healer_fallbacks"] for r in all_runs) / llm_calls if llm_calls else 0.0,
+        "round_trips_saved_per_goal": sum(r["round_trips_saved"] for r in all_runs) / len(all_runs),
+        # Replans re-emit files that are already on disk; those writes are skipped
+        "bytes_written": sum(r["bytes_written"] for r in all_runs),
+        "bytes_requested": sum(r["bytes_requested"] for r in all_runs),
+    }
+    print(f"\n📊 Overall: p50 {overall['p50']:.3f}s  p90 {overall['p90']:.3f}s  p99 {overall['p99']:.3f}s  "
+          f"replans/goal {overall['replans_per_goal']:.2f}  success {overall['success_rate']:.0%}  "
+          f"prompt tokens/goal {overall['prompt_tokens_per_goal']:.0f}  parse failures {overall['parse_failure_rate']:.0%}  "
+          f"round trips saved/goal {overall['round_trips_saved_per_goal']:.2f}  "
+          f"bytes written {overall['bytes_written']}/{overall['bytes_requested']}")
+    return results, overall, mismatches
+
+
+def print_comparison(reports):
+    """Side by side: `format: "json"` against the JSON Schema `format`."""
+    rows = [
+        ("parse failure rate", "parse_failure_rate", "{:.1%}"),
+        ("full healer passes", "healer_fallback_rate", "{:.1%}"),
+        ("planning p50 (s)", "plan_p50", "{:.3f}"),
+        ("planning p90 (s)", "plan_p90", "{:.3f}"),
+        ("end-to-end p50 (s)", "p50", "{:.3f}"),
+        ("end-to-end p90 (s)", "p90", "{:.3f}"),
+        ("replans per goal", "replans_per_goal", "{:.2f}"),
+        ("success rate", "success_rate", "{:.0%}"),
+    ]
+    print("\n🧷 Structured output comparison")
+    print(f"  {'':<22}{'format=json':>14}{'JSON Schema':>14}")
+    for label, key, fmt in rows:
+        print(f"  {label:<22}{fmt.format(reports['json'][key]):>14}{fmt.format(reports['schema'][key]):>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH, help="JSON list of {goal, match, responses}; recorded model outputs work as responses too")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per goal")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.001, help="mock seconds between streamed chunks")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--prompt-tps", type=float, default=0.0, help="mock prompt eval speed in tokens/s, so longer prompts cost time (0 = free)")
+    parser.add_argument("--no-context", action="store_true", help="send full stateless prompts on replans instead of continuing the Ollama context")
+    parser.add_argument("--no-stream", action="store_true", help="plan with one blocking request instead of streaming")
+    parser.add_argument("--workers", type=int, default=4, help="parallel_workers for the executor")
+    parser.add_argument("--plan-cache", action="store_true", help="let repeated goals hit the plan cache (off by default so every run measures a generation)")
+    parser.add_argument("--no-validate", action="store_true", help="skip the static plan check, so bad plans fail at execution time instead")
+    parser.add_argument("--structured", action="store_true", help="constrain plans with the JSON Schema `format`")
+    parser.add_argument("--compare-structured", action="store_true", help="run the corpus with and without the schema and compare them")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-p90", type=float, help="exit non-zero if the overall p90 latency (seconds) is above this")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    scenarios = load_scenarios(args.scenarios)
+    mock = MockOllama(scenarios, latency=args.latency, token_delay=args.token_delay, jitter=args.jitter, prompt_tps=args.prompt_tps)
+    os.environ["OLLAMA_HOST"] = mock.serve()
+    os.environ.setdefault("OLLAMA_RETRIES", "0")
+
+    options = {
+        "stream_plan": not args.no_stream,
+        "parallel_workers": args.workers,
+        "use_plan_cache": args.plan_cache,
+        "carry_context": not args.no_context,
+        "structured_output": args.structured,
+        "validate_plan": not args.no_validate,
+    }
+    modes = {"json": False, "schema": True} if args.compare_structured else {"schema" if args.structured else "json": args.structured}
+
+    # nodes.py works on ./workspace, so every run happens inside a scratch directory
+    scratch = tempfile.mkdtemp(prefix="pocketflow-bench-")
+    os.chdir(scratch)
+    reports, all_results, mismatches = {}, {}, 0
+    try:
+        for mode, structured in modes.items():
+            print(f"\n🏁 {len(scenarios)} goals x {args.repeat} runs against {os.environ['OLLAMA_HOST']} "
+                  f"({'blocking' if args.no_stream else 'streaming'}, latency {args.latency}s, format={mode})")
+            # Some scenarios only succeed with the schema, so expectations are checked on plain runs only
+            results, overall, bad = run_corpus(mock, scenarios, dict(options, structured_output=structured), args.repeat, check=not args.compare_structured)
+            reports[mode], all_results[mode] = overall, results
+            mismatches += bad
+    finally:
+        mock.shutdown()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.compare_structured:
+        print_comparison(reports)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "overall": reports, "scenarios": all_results, "mock_requests": mock.requests}, f, indent=2)
+
+    too_slow = args.max_p90 is not None and max(r["p90"] for r in reports.values()) > args.max_p90
+    if too_slow:
+        print(f"❌ p90 is above the --max-p90 budget of {args.max_p90}s")
+    sys.exit(1 if mismatches or too_slow else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Healer benchmark: checks the corpus of real malformed model outputs and reports parse throughput.
+
+Usage: python benchmarks/bench_healer.py [--scale 200] [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from healer import heal_json, map_tasks, TaskStreamParser
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "healer_corpus.jsonl")
+
+
+def legacy_heal_json(raw_text):
+    """The original PlanNode.exec loop, kept verbatim as the baseline (re-slices on every failure)."""
+    decoder = json.JSONDecoder()
+    parsed_data = []
+    text_to_parse = raw_text
+
+    while text_to_parse:
+        start_dict = text_to_parse.find('{')
+        start_list = text_to_parse.find('[')
+
+        starts = [i for i in (start_dict, start_list) if i != -1]
+        if not starts:
+            break
+
+        start_idx = min(starts)
+        text_to_parse = text_to_parse[start_idx:]
+
+        try:
+            obj, idx = decoder.raw_decode(text_to_parse)
+            parsed_data.append(obj)
+            text_to_parse = text_to_parse[idx:]
+        except json.JSONDecodeError:
+            text_to_parse = text_to_parse[1:]
+    return parsed_data
+
+
+def streamed_tasks(raw_text, chunk_size=4):
+    parser = TaskStreamParser()
+    tasks = []
+    for i in range(0, len(raw_text), chunk_size):
+        tasks.extend(parser.feed(raw_text[i:i + chunk_size]))
+    return tasks
+
+
+def load_corpus():
+    with open(CORPUS_PATH) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stress_inputs(scale):
+    """Synthetic large outputs: huge write_file payloads, long chatter and truncated plans."""
+    code = "def handler(event):\n    return {'status': [200, \"ok\"]}\n" * scale
+    big_write = json.dumps([{"action": "mkdir", "target": "big"}, {"action": "write_file", "target": "big/app.py", "content": code}])
+    chatter = ("The model keeps talking about {braces} and [brackets] without closing them. " * scale) + big_write
+    truncated = big_write[: int(len(big_write) * 0.9)]
+    unclosed = ("{" + '"note": "unclosed wrapper", ' * scale) + big_write
+    pseudo_json = ("{'action': 'mkdir', 'target': 'single_quoted'}\n" * scale) + big_write
+    return [
+        {"name": "large_write_file", "text": big_write},
+        {"name": "chatty_unbalanced_prose", "text": chatter},
+        {"name": "truncated_large_write", "text": truncated},
+        {"name": "unclosed_outer_wrapper", "text": unclosed},
+        {"name": "single_quoted_pseudo_json", "text": pseudo_json},
+    ]
+
+
+def throughput(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    mb = len(text.encode("utf-8")) / 1e6
+    return mb / best if best > 0 else float("inf"), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=200, help="size multiplier for the synthetic stress inputs")
+    parser.add_argument("--repeat", type=int, default=5, help="best-of-N timing runs per input")
+    parser.add_argument("--legacy-timeout", type=float, default=20.0, help="only repeat the legacy healer when a single run is faster than this many seconds")
+    args = parser.parse_args()
+
+    print("🩹 Corpus correctness (tasks found / expected, every healer goes through the same mapper)")
+    failures = 0
+    for case in load_corpus():
+        healed = len(map_tasks(heal_json(case["text"])))
+        legacy = len(map_tasks(legacy_heal_json(case["text"])))
+        streamed = len(streamed_tasks(case["text"]))
+        ok = healed == case["expected_tasks"]
+        failures += not ok
+        print(f"  {'✅' if ok else '❌'} {case['name']:<28} new={healed} legacy={legacy} streamed={streamed} expected={case['expected_tasks']}")
+
+    print(f"\n⏱️  Throughput (best of {args.repeat}, MB/s)")
+    print(f"  {'input':<28}{'size':>10}{'legacy':>12}{'new':>12}{'speedup':>10}")
+    corpus_text = "\n".join(case["text"] for case in load_corpus())
+    inputs = [{"name": "corpus_concatenated", "text": corpus_text}] + stress_inputs(args.scale)
+    for item in inputs:
+        text = item["text"]
+        new_mbs, _ = throughput(heal_json, text, args.repeat)
+        legacy_mbs, legacy_time = throughput(legacy_heal_json, text, 1)
+        if legacy_time < args.legacy_timeout:
+            legacy_mbs, _ = throughput(legacy_heal_json, text, args.repeat)
+        print(f"  {item['name']:<28}{len(text) / 1e3:>8.1f}KB{legacy_mbs:>12.2f}{new_mbs:>12.2f}{new_mbs / legacy_mbs:>9.1f}x")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
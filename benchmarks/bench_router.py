@@ -0,0 +1,107 @@
+"""Router benchmark: the goal corpus against several mock Ollama servers, with and without hedging.
+
+Every mock now and then stalls (--stall-rate / --stall-seconds), which is the tail that hedging cuts.
+Modes: one server, the least-loaded router over all of them, and the router with hedged plans.
+
+Usage: python benchmarks/bench_router.py [--servers 2] [--latency 0.05] [--stall-rate 0.2] [--stall-seconds 1.0] [--hedge-after 0.3] [--dead-endpoint]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_ollama import MockOllama, load_scenarios, SCENARIOS_PATH
+from bench_flow import percentile, run_goal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH)
+    parser.add_argument("--servers", type=int, default=2, help="mock servers behind the router")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per goal and mode")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.001)
+    parser.add_argument("--stall-rate", type=float, default=0.2, help="share of requests a mock stalls")
+    parser.add_argument("--stall-seconds", type=float, default=1.0)
+    parser.add_argument("--hedge-after", type=float, default=0.3, help="seconds before the hedge request goes out")
+    parser.add_argument("--dead-endpoint", action="store_true", help="also list a server that isn't running, to exercise health tracking")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    # Single-response scenarios: the mocks count attempts per goal, and replans can land on any server
+    scenarios = [s for s in load_scenarios(args.scenarios) if s.get("expect_success") and len(s["responses"]) == 1]
+    mocks = [MockOllama(scenarios, latency=args.latency, token_delay=args.token_delay, seed=n, stall_rate=args.stall_rate, stall_seconds=args.stall_seconds)
+             for n in range(args.servers)]
+    urls = [mock.serve() for mock in mocks]
+    os.environ["OLLAMA_HOST"] = urls[0]
+    os.environ.setdefault("OLLAMA_RETRIES", "0")
+    os.environ.setdefault("OLLAMA_CONNECT_TIMEOUT", "0.5")
+
+    from flow import build_flow
+    from metrics import RunTrace
+    from ollama_client import client_from_env
+    from router import ModelRouter, set_router
+
+    router_urls = urls + (["http://127.0.0.1:9"] if args.dead_endpoint else [])
+    modes = {
+        "one server": ([urls[0]], None),
+        "router": (router_urls, None),
+        "router + hedge": (router_urls, args.hedge_after),
+    }
+    options = {"stream_plan": False, "parallel_workers": 4, "use_plan_cache": False}
+    scratch = tempfile.mkdtemp(prefix="pocketflow-router-")
+    os.chdir(scratch)
+    reports = {}
+    try:
+        print(f"🏁 {len(scenarios)} goals x {args.repeat} runs, {args.servers} servers "
+              f"(latency {args.latency}s, {args.stall_rate:.0%} of requests stall {args.stall_seconds}s)")
+        print(f"  {'mode':<16}{'p50':>8}{'p90':>8}{'p99':>8}{'success':>9}{'hedges':>8}{'won':>6}{'dropped':>9}  calls per endpoint")
+        for mode, (endpoint_urls, hedge_after) in modes.items():
+            router = ModelRouter([client_from_env(u) for u in endpoint_urls])
+            set_router(router)
+            # Every mode starts from the same stall sequence, so the differences are the router's doing
+            for n, mock in enumerate(mocks):
+                mock.reset(seed=n)
+            disconnects = sum(m.disconnects for m in mocks)
+            runs = []
+            for _ in range(args.repeat):
+                for scenario in scenarios:
+                    runs.append(run_goal(build_flow, RunTrace, scenario["goal"], dict(options, hedge_after=hedge_after)))
+            seconds = [r["seconds"] for r in runs]
+            snapshot = router.snapshot()
+            reports[mode] = {
+                "p50": percentile(seconds, 50), "p90": percentile(seconds, 90), "p99": percentile(seconds, 99),
+                "success_rate": sum(r["success"] for r in runs) / len(runs),
+                "hedges": snapshot["hedges"],
+                # Losers the mocks saw hang up mid-generation (a stalled loser only notices when it next writes)
+                "dropped": sum(m.disconnects for m in mocks) - disconnects,
+                "endpoints": {e["url"]: {"calls": e["calls"], "healthy": e["healthy"]} for e in snapshot["endpoints"]},
+            }
+            r = reports[mode]
+            calls = " ".join(f"{e['calls']}{'' if e['healthy'] else '(down)'}" for e in snapshot["endpoints"])
+            print(f"  {mode:<16}{r['p50']:>8.3f}{r['p90']:>8.3f}{r['p99']:>8.3f}{r['success_rate']:>8.0%}"
+                  f"{r['hedges']['fired']:>8}{r['hedges']['won']:>6}{r['dropped']:>9}  {calls}")
+    finally:
+        for mock in mocks:
+            mock.shutdown()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    base, hedged = reports["router"], reports["router + hedge"]
+    print(f"\n📊 Hedging (router -> router + hedge): p90 {base['p90']:.3f}s -> {hedged['p90']:.3f}s, p99 {base['p99']:.3f}s -> {hedged['p99']:.3f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "modes": reports}, f, indent=2)
+    sys.exit(0 if all(r["success_rate"] == 1 for r in reports.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Multi-session benchmark: several simulated UI sessions share one mock Ollama server.
+
+Each session gets its own session id and workspace, like a browser tab in app.py. One "bursty"
+session can fire several goals at once to check that it doesn't starve the others.
+
+Usage: python benchmarks/bench_sessions.py [--sessions 6] [--goals 3] [--max-in-flight 2] [--burst 4] [--no-scheduler]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_ollama import MockOllama, load_scenarios, SCENARIOS_PATH
+from bench_flow import percentile
+
+
+def jain_index(values):
+    """1.0 when every session got the same service, 1/n when one session got all of it."""
+    values = [v for v in values if v > 0]
+    if not values:
+        return 1.0
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+
+def run_session(session_id, goals, workspace, options, results):
+    from flow import build_flow
+    from metrics import RunTrace
+    runs = []
+    for goal in goals:
+        shared = {
+            "user_goal": goal,
+            "model": "mock",
+            "session_id": session_id,
+            "workspace": workspace,
+            "cancel_event": threading.Event(),
+            "trace": RunTrace(goal=goal, model="mock", trace_dir=None),
+            **options,
+        }
+        start = time.perf_counter()
+        error = None
+        try:
+            build_flow().run(shared)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        runs.append({"seconds": time.perf_counter() - start, "success": error is None and bool(shared.get("tasks")), "error": error})
+    results[session_id] = results.get(session_id, []) + runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH)
+    parser.add_argument("--sessions", type=int, default=6, help="concurrent sessions")
+    parser.add_argument("--goals", type=int, default=3, help="goals each session runs, one after another")
+    parser.add_argument("--burst", type=int, default=4, help="goals the first session fires all at once (0 = no bursty session)")
+    parser.add_argument("--max-in-flight", type=int, default=2, help="generations the scheduler lets through at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.001)
+    parser.add_argument("--no-scheduler", action="store_true", help="no limiter: every request goes straight to the server")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    # Scenarios that succeed on their first response; the mock counts attempts per goal, so
+    # multi-attempt scenarios would step on each other across sessions
+    scenarios = [s for s in load_scenarios(args.scenarios) if s.get("expect_success") and len(s["responses"]) == 1]
+    mock = MockOllama(scenarios, latency=args.latency, token_delay=args.token_delay)
+    os.environ["OLLAMA_HOST"] = mock.serve()
+    os.environ.setdefault("OLLAMA_RETRIES", "0")
+
+    from ollama_client import get_client
+    from scheduler import FairScheduler
+    scheduler = None if args.no_scheduler else FairScheduler(args.max_in_flight)
+    get_client().set_limiter(scheduler)
+
+    options = {"stream_plan": True, "parallel_workers": 4, "use_plan_cache": False}
+    scratch = tempfile.mkdtemp(prefix="pocketflow-sessions-")
+    os.chdir(scratch)
+    results, threads, workspaces = {}, [], {}
+    try:
+        for n in range(args.sessions):
+            session_id = f"session-{n}"
+            workspaces[session_id] = os.path.join(scratch, "workspaces", session_id)
+            goals = [scenarios[(n + i) % len(scenarios)]["goal"] for i in range(args.goals)]
+            if n == 0 and args.burst:
+                # A bursty user: several flows at once under one session id, each in its own folder
+                for b in range(args.burst):
+                    threads.append(threading.Thread(target=run_session, args=(session_id, goals[:1], os.path.join(workspaces[session_id], f"burst-{b}"), options, results)))
+            else:
+                threads.append(threading.Thread(target=run_session, args=(session_id, goals, workspaces[session_id], options, results)))
+
+        print(f"🏁 {args.sessions} sessions against {os.environ['OLLAMA_HOST']} "
+              f"({'no scheduler' if args.no_scheduler else f'fair scheduler, max {args.max_in_flight} in flight'}, latency {args.latency}s)")
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+
+        waits = scheduler.snapshot()["waits"] if scheduler else {}
+        print(f"  {'session':<12}{'goals':>6}{'p50':>8}{'p90':>8}{'success':>9}{'avg wait':>10}{'max wait':>10}")
+        per_session = {}
+        for session_id in sorted(results):
+            runs = results[session_id]
+            seconds = [r["seconds"] for r in runs]
+            wait = waits.get(session_id, {"avg_seconds": 0.0, "max_seconds": 0.0})
+            per_session[session_id] = {
+                "goals": len(runs), "p50": percentile(seconds, 50), "p90": percentile(seconds, 90),
+                "success_rate": sum(r["success"] for r in runs) / len(runs),
+                "avg_wait": wait["avg_seconds"], "max_wait": wait["max_seconds"],
+                "errors": sorted({r["error"] for r in runs if r["error"]}),
+            }
+            s = per_session[session_id]
+            print(f"  {session_id:<12}{s['goals']:>6}{s['p50']:>8.3f}{s['p90']:>8.3f}{s['success_rate']:>8.0%}{s['avg_wait']:>10.3f}{s['max_wait']:>10.3f}")
+
+        # Every session wrote into its own folder and nothing landed in the shared ./workspace
+        isolated = not os.path.exists(os.path.join(scratch, "workspace")) and all(
+            os.path.isdir(ws) and any(name != ".gitignore" for _, _, files in os.walk(ws) for name in files)
+            for ws in workspaces.values()
+        )
+        all_seconds = [r["seconds"] for runs in results.values() for r in runs]
+        overall = {
+            "wall_seconds": wall,
+            "p50": percentile(all_seconds, 50), "p90": percentile(all_seconds, 90),
+            "server_max_in_flight": mock.max_in_flight,
+            "fairness": jain_index([s["avg_wait"] for s in per_session.values()]) if scheduler else None,
+            "isolated": isolated,
+        }
+    finally:
+        mock.shutdown()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    over_cap = scheduler is not None and overall["server_max_in_flight"] > args.max_in_flight
+    print(f"\n📊 Overall: wall {overall['wall_seconds']:.2f}s  p50 {overall['p50']:.3f}s  p90 {overall['p90']:.3f}s  "
+          f"server max in flight {overall['server_max_in_flight']}"
+          + (f"  wait fairness {overall['fairness']:.2f}" if overall["fairness"] is not None else "")
+          + f"  workspaces isolated {'✅' if isolated else '❌'}")
+    if over_cap:
+        print(f"❌ the server saw more than {args.max_in_flight} generations at once")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "overall": overall, "sessions": per_session}, f, indent=2)
+    sys.exit(1 if over_cap or not isolated or any(s["success_rate"] < 1 for s in per_session.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
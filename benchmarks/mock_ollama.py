@@ -0,0 +1,258 @@
+"""A local stand-in for the Ollama HTTP API that replays recorded or synthetic plans.
+
+Usage: python benchmarks/mock_ollama.py [--port 11434] [--latency 0.5] [--token-delay 0.005]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from healer import heal_tasks, validate_task
+
+SCENARIOS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_scenarios.json")
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose (a cancelled plan stream, a closed pool); that's not a failure
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockOllama:
+    """Scenario-driven /api/generate. Each scenario matches a goal substring and lists one
+    response per attempt, so replans walk through e.g. malformed -> failing -> fixed plans.
+    """
+    def __init__(self, scenarios=None, latency=0.0, token_delay=0.0, jitter=0.0, chunk_size=6, models=("mock",), seed=0, prompt_tps=0.0, stall_rate=0.0, stall_seconds=0.0):
+        self.scenarios = scenarios if scenarios is not None else load_scenarios()
+        self.latency = latency
+        self.token_delay = token_delay
+        self.prompt_tps = prompt_tps  # prompt eval speed; 0 means prompt length costs nothing
+        self.jitter = jitter
+        # Now and then a request hangs for `stall_seconds` (a busy GPU, a model swap): the tail hedging is for
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.chunk_size = chunk_size
+        self.models = list(models)
+        self.attempts = {}
+        self.conversations = []  # `context` handed back to clients is [index into this list]
+        self.warmups = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.disconnects = 0  # clients that hung up mid-generation
+        self.lock = threading.Lock()
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.seen = {}  # prompt -> times asked, so a repeated request gets the same stall draw in every run
+        self.server = None
+
+    def pick_response(self, prompt, constrained=False):
+        """The scenario's response for this attempt. With a JSON Schema `format` the mock plays a
+        grammar-constrained model: the scenario's "constrained" responses, or else the same tasks
+        re-emitted as a clean array (dropping anything the schema would not allow)."""
+        for scenario in self.scenarios:
+            if scenario["match"].lower() in prompt.lower():
+                with self.lock:
+                    attempt = self.attempts.get(scenario["match"], 0)
+                    self.attempts[scenario["match"]] = attempt + 1
+                responses = scenario.get("constrained", scenario["responses"]) if constrained else scenario["responses"]
+                response = responses[min(attempt, len(responses) - 1)]
+                response = response if isinstance(response, str) else json.dumps(response)
+                if constrained and "constrained" not in scenario:
+                    response = json.dumps([t for t in heal_tasks(response) if validate_task(t)])
+                return response
+        return '[{"action": "mkdir", "target": "unmatched_goal"}]'
+
+    def history(self, context):
+        """The conversation a client's `context` refers to. Only the new prompt counts as evaluated."""
+        if not context:
+            return ""
+        with self.lock:
+            return self.conversations[context[0]] if 0 <= context[0] < len(self.conversations) else ""
+
+    def remember(self, text):
+        with self.lock:
+            self.conversations.append(text)
+            return [len(self.conversations) - 1]
+
+    def reset(self, seed=None):
+        """Forgets the scenario attempts; with `seed`, also restarts the jitter and stall sequence."""
+        with self.lock:
+            self.attempts.clear()
+            if seed is not None:
+                self.seed = seed
+                self.random.seed(seed)
+                self.seen.clear()
+
+    def delay(self, prompt_tokens=0, prompt=None):
+        """Sleeps like a model would. With `prompt`, whether it stalls depends only on the seed, the
+        prompt and how often this server has seen it, not on how many other requests came first."""
+        seconds = prompt_tokens / self.prompt_tps if self.prompt_tps else 0.0
+        with self.lock:
+            rng = self.random
+            if prompt is not None:
+                n = self.seen.get(prompt, 0)
+                self.seen[prompt] = n + 1
+                rng = random.Random(f"{self.seed}:{n}:{prompt}")
+            jitter = rng.uniform(-self.jitter, self.jitter)
+            stalled = self.stall_rate and rng.random() < self.stall_rate
+        if self.latency:
+            seconds += max(0.0, self.latency + jitter)
+        if stalled:
+            seconds += self.stall_seconds
+        if seconds:
+            time.sleep(seconds)
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Starts the server on a background thread and returns its base URL."""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/":
+                    self._send(200, "Ollama is running", "text/plain")
+                elif self.path == "/api/tags":
+                    self._send(200, json.dumps({"models": [{"name": m} for m in mock.models]}))
+                else:
+                    self._send(404, json.dumps({"error": "not found"}))
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self._send(404, json.dumps({"error": "not found"}))
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with mock.lock:
+                    mock.requests += 1
+                    mock.in_flight += 1
+                    mock.max_in_flight = max(mock.max_in_flight, mock.in_flight)
+                self.generating = True
+                try:
+                    self._generate(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    with mock.lock:
+                        mock.disconnects += 1
+                finally:
+                    self._done_generating()
+
+            def _done_generating(self):
+                # Called before the final message goes out: once the client has it, it may free its slot
+                # and send the next request, which must not find this one still counted
+                if self.generating:
+                    self.generating = False
+                    with mock.lock:
+                        mock.in_flight -= 1
+
+            def _generate(self, body):
+                if body.get("model") not in mock.models:
+                    self._done_generating()
+                    self._send(404, json.dumps({"error": f"model '{body.get('model')}' not found"}))
+                    return
+                prompt = body.get("prompt", "")
+                if not prompt:
+                    # An empty prompt only loads the model (what warm-ups send)
+                    with mock.lock:
+                        mock.warmups += 1
+                    mock.delay()
+                    self._done_generating()
+                    self._send(200, json.dumps({"model": body.get("model"), "response": "", "done": True, "load_duration": int(mock.latency * 1e9)}))
+                    return
+                history = mock.history(body.get("context"))
+                text = mock.pick_response(history + prompt, constrained=isinstance(body.get("format"), dict))
+                context = mock.remember(history + prompt + text)
+                started = time.perf_counter()
+                mock.delay(len(prompt) // 4, history + prompt)
+                chunks = [text[i:i + mock.chunk_size] for i in range(0, len(text), mock.chunk_size)] or [""]
+                stats = {
+                    "prompt_eval_count": len(prompt) // 4,
+                    "prompt_eval_duration": int(mock.latency * 1e9),
+                    "eval_count": len(chunks),
+                    "load_duration": 0,
+                }
+                if not body.get("stream", True):
+                    time.sleep(mock.token_delay * len(chunks))
+                    stats["eval_duration"] = max(1, int((time.perf_counter() - started - mock.latency) * 1e9))
+                    stats["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                    self._done_generating()
+                    self._send(200, json.dumps({"model": body.get("model"), "response": text, "done": True, "context": context, **stats}))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in chunks:
+                    self._write_chunk(json.dumps({"model": body.get("model"), "response": chunk, "done": False}) + "\n")
+                    if mock.token_delay:
+                        time.sleep(mock.token_delay)
+                stats["eval_duration"] = max(1, int((time.perf_counter() - started - mock.latency) * 1e9))
+                stats["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                self._done_generating()
+                self._write_chunk(json.dumps({"model": body.get("model"), "response": "", "done": True, "context": context, **stats}) + "\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, line):
+                data = line.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        self.server = QuietServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def load_scenarios(path=SCENARIOS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first token (prompt eval + load)")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds between streamed chunks")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--prompt-tps", type=float, default=0.0, help="prompt tokens evaluated per second (0 = free)")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share of requests that hang for --stall-seconds")
+    parser.add_argument("--stall-seconds", type=float, default=0.0)
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH)
+    args = parser.parse_args()
+
+    mock = MockOllama(load_scenarios(args.scenarios), latency=args.latency, token_delay=args.token_delay, jitter=args.jitter, prompt_tps=args.prompt_tps,
+                      stall_rate=args.stall_rate, stall_seconds=args.stall_seconds)
+    url = mock.serve(port=args.port)
+    print(f"🧪 Mock Ollama listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.shutdown()
+
+
+if __name__ == "__main__":
+    main()
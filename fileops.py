@@ -0,0 +1,232 @@
+import os
+import mmap
+import shutil
+import time
+import hashlib
+import tempfile
+import threading
+
+READ_FILE_MAX_BYTES = 16 * 1024  # larger files come back as head + tail unless a range is asked for
+MMAP_THRESHOLD = 256 * 1024
+WORKSPACE_DIR = "workspace"
+SESSIONS_DIR = "workspaces"  # one sandbox per browser session in the web UI
+SESSION_STALE_SECONDS = 7 * 24 * 3600  # session sandboxes nobody has opened for this long are removed
+REFLINK_THRESHOLD = 1024 * 1024  # copies above this try a copy-on-write clone first
+_FICLONE = 0x40049409  # Linux ioctl: share the source's extents (btrfs, xfs, bcachefs...)
+
+# path -> (size, mtime_ns, inode, sha256), so an unchanged file is only hashed once
+_digests = {}
+_digests_lock = threading.Lock()
+
+_umask_value = None
+_umask_lock = threading.Lock()
+
+
+def _umask():
+    """The process umask, read without changing it where the kernel reports it (Linux 4.7+)."""
+    global _umask_value
+    with _umask_lock:
+        if _umask_value is None:
+            try:
+                with open("/proc/self/status") as f:
+                    _umask_value = next(int(line.split()[1], 8) for line in f if line.startswith("Umask:"))
+            except (OSError, StopIteration, ValueError, IndexError):
+                # os.umask can only be read by setting it: restore it straight away, once
+                _umask_value = os.umask(0o022)
+                os.umask(_umask_value)
+        return _umask_value
+
+
+def ensure_workspace(path=WORKSPACE_DIR):
+    """Creates the sandbox folder (with a .gitignore so generated code stays out of git) on first use."""
+    if not os.path.exists(path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, ".gitignore"), "w") as f:
+            f.write("*\n!.gitignore\n")
+    return path
+
+
+def _prune_sessions(root, keep):
+    cutoff = time.time() - SESSION_STALE_SECONDS
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            stale = name != keep and os.path.isdir(path) and os.path.getmtime(path) < cutoff
+        except OSError:
+            continue
+        if stale:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def session_workspace(session_id, root=SESSIONS_DIR):
+    """The sandbox for one UI session, so concurrent users never see each other's files.
+
+    Every call touches the folder, so its mtime is when the session was last used. Opening a
+    new session removes the sandboxes of sessions idle for SESSION_STALE_SECONDS.
+    """
+    path = os.path.join(root, session_id)
+    if os.path.isdir(path):
+        os.utime(path)
+        return path
+    ensure_workspace(path)
+    _prune_sessions(root, keep=session_id)
+    return path
+
+
+def _decode(data):
+    return data.decode("utf-8", errors="replace")
+
+
+def read_range(path, offset=0, length=None, max_bytes=READ_FILE_MAX_BYTES):
+    """Reads part of a file without loading the whole thing.
+
+    With no `length`, small files are returned whole and large ones as their first and last
+    `max_bytes // 2` bytes. Files above MMAP_THRESHOLD are memory-mapped so only the pages
+    that are actually sliced get read from disk.
+
+    Returns (text, size, note) where `note` says what was left out, if anything.
+    """
+    size = os.path.getsize(path)
+    offset = max(0, min(int(offset or 0), size))
+    if length is not None:
+        length = max(0, min(int(length), max_bytes, size - offset))
+        ranges = [(offset, offset + length)]
+    elif size - offset <= max_bytes:
+        ranges = [(offset, size)]
+    else:
+        half = max_bytes // 2
+        ranges = [(offset, offset + half), (size - half, size)]
+
+    if size == 0:
+        return "", 0, ""
+    with open(path, "rb") as f:
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                chunks = [mm[start:end] for start, end in ranges]
+        else:
+            chunks = []
+            for start, end in ranges:
+                f.seek(start)
+                chunks.append(f.read(end - start))
+
+    if len(chunks) == 1:
+        start, end = ranges[0]
+        note = "" if (start, end) == (0, size) else f"bytes {start}-{end} of {size}"
+        return _decode(chunks[0]), size, note
+
+    (_, head_end), (tail_start, _) = ranges
+    omitted = tail_start - head_end
+    text = _decode(chunks[0]) + f"\n[... {omitted} bytes omitted; read_file with \"offset\"/\"length\" to see them ...]\n" + _decode(chunks[1])
+    return text, size, f"first and last {max_bytes // 2} bytes of {size}"
+
+
+def file_digest(path):
+    """sha256 of a file, cached until its size, mtime or inode changes."""
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns, st.st_ino)
+    with _digests_lock:
+        cached = _digests.get(path)
+    if cached and cached[:3] == stamp:
+        return cached[3]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _digests_lock:
+        _digests[path] = stamp + (digest,)
+    return digest
+
+
+def _same_content(path, size, digest):
+    """True if `path` already holds bytes of this size and sha256. The size check is free; the hash isn't."""
+    try:
+        return os.path.isfile(path) and os.path.getsize(path) == size and file_digest(path) == digest
+    except OSError:
+        return False
+
+
+def _atomic_target(path):
+    """A temp file next to `path`, so the final os.replace never crosses a filesystem."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    return fd, tmp
+
+
+def _replace(tmp, path, mode_from=None):
+    """Renames the temp file over `path`, keeping the permissions the old file (or `mode_from`) had."""
+    try:
+        source = mode_from or (path if os.path.exists(path) else None)
+        if source:
+            shutil.copymode(source, tmp)
+        else:
+            os.chmod(tmp, 0o666 & ~_umask())  # mkstemp makes 0600; give new files the usual mode
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_if_changed(path, content):
+    """Writes `content` atomically (temp file + rename), unless the file already holds exactly it.
+
+    Returns (status, bytes_written, bytes_requested) with status "written" or "unchanged".
+    Skipping identical writes keeps mtimes (and whatever watches them) still across replans.
+    """
+    data = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+    digest = hashlib.sha256(data).hexdigest()
+    if _same_content(path, len(data), digest):
+        return "unchanged", 0, len(data)
+    fd, tmp = _atomic_target(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _replace(tmp, path)
+    st = os.stat(path)
+    with _digests_lock:
+        _digests[path] = (st.st_size, st.st_mtime_ns, st.st_ino, digest)
+    return "written", len(data), len(data)
+
+
+def _reflink(source, dest_fd):
+    try:
+        import fcntl
+        with open(source, "rb") as src:
+            fcntl.ioctl(dest_fd, _FICLONE, src.fileno())
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+def copy_if_changed(source, target):
+    """Copies `source` to `target` atomically, skipping it if the bytes are already there.
+
+    Big files are cloned copy-on-write where the filesystem supports it, so the copy costs no
+    data I/O and the two files still can't affect each other. Hardlinks are never used: a later
+    `run_cmd` could append to one file and silently change the other.
+
+    Returns (status, bytes_written, bytes_requested) with status "unchanged", "reflinked" or "copied".
+    """
+    size = os.path.getsize(source)
+    if _same_content(target, size, file_digest(source)):
+        return "unchanged", 0, size
+    fd, tmp = _atomic_target(target)
+    try:
+        if size >= REFLINK_THRESHOLD and _reflink(source, fd):
+            os.close(fd)
+            status, written = "reflinked", 0
+        else:
+            os.close(fd)
+            shutil.copyfile(source, tmp)  # sendfile / copy_file_range where the platform has it
+            status, written = "copied", size
+        shutil.copystat(source, tmp)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _replace(tmp, target, mode_from=source)
+    return status, written, size
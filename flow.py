@@ -1,14 +1,18 @@
 from pocketflow import Flow
-from nodes import PlanNode, ExecuteNode, SummaryNode
+from nodes import PlanNode, ValidateNode, ExecuteNode, SummaryNode
 
 def build_flow():
     """Constructs and wires the PocketFlow graph."""
     planner = PlanNode()
+    validator = ValidateNode()
     executor = ExecuteNode()
     summarizer = SummaryNode()
 
     # The Graph routing
-    planner - "next_task" >> executor
+    planner - "next_task" >> validator
+    validator - "next_task" >> executor
+    validator - "replan" >> planner     # everything wrong with the plan, in one round trip
+    validator - "done" >> summarizer
     executor - "next_task" >> executor  
     
     # --- NEW: The Feedback Loop! ---
@@ -0,0 +1,381 @@
+import re
+import json
+from bisect import bisect_right
+
+ALLOWED_ACTIONS = ["mkdir", "write_file", "read_file", "run_cmd", "copy"]
+
+# Characters that change the JSON structure. Everything else is skipped in C by the regex engine.
+_STRUCTURAL = re.compile(r'[{}\[\]",]')
+# The rest of a JSON string body: stops at the closing quote, or at a lone trailing backslash.
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+# An opener raw_decode could succeed from: '{' before a key or '}', '[' before a value or ']'.
+# Prose like {braces} or {'single': 'quoted'} is skipped in C instead of failing one decode each.
+_OPENER = re.compile(r'\{\s*["}]|\[\s*[\]\["{\-0-9tfnNI]')
+_CLOSERS = {"{": "}", "[": "]"}
+_MAX_DEPTH = 8
+_RETRY_BUDGET = 2  # failed in-place decodes may re-read the text this many times over
+
+
+class JsonScanner:
+    """Single-pass, resumable bracket matcher over a growing buffer.
+
+    Text is kept as the list of chunks it arrived in and is never re-copied while scanning.
+    `feed()` returns every container that closed in the new chunk as (start, end, kind) offsets.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.offsets = []
+        self.length = 0
+        self.stack = []         # (kind, start offset) of every container that is still open
+        self.commas = {}        # depth -> offset of the latest comma directly inside an open '['
+        self.in_string = False
+        self.escape_pending = False
+
+    def feed(self, chunk):
+        closed = []
+        if not chunk:
+            return closed
+        base = self.length
+        self.chunks.append(chunk)
+        self.offsets.append(base)
+        self.length += len(chunk)
+
+        stack = self.stack
+        n = len(chunk)
+        i = 0
+        if self.escape_pending:
+            # The previous chunk ended on a backslash inside a string, so this char is escaped
+            self.escape_pending = False
+            i = 1
+
+        while i < n:
+            if self.in_string:
+                j = _STRING_BODY.match(chunk, i).end()
+                if j >= n:
+                    break
+                if chunk[j] == '"':
+                    self.in_string = False
+                    i = j + 1
+                else:
+                    self.escape_pending = True
+                    break
+                continue
+
+            m = _STRUCTURAL.search(chunk, i)
+            if not m:
+                break
+            j = m.start()
+            ch = chunk[j]
+            i = j + 1
+
+            if ch == '"':
+                # Quotes in chatty prose outside any JSON value are ignored
+                if stack: self.in_string = True
+            elif ch == "{" or ch == "[":
+                stack.append((ch, base + j))
+            elif ch == ",":
+                if stack and stack[-1][0] == "[":
+                    self.commas[len(stack)] = base + j
+            else:
+                want = "{" if ch == "}" else "["
+                # Tolerate mismatched brackets: close the nearest container of the right kind
+                k = len(stack) - 1
+                while k >= 0 and stack[k][0] != want:
+                    k -= 1
+                if k < 0:
+                    continue
+                kind, start = stack[k]
+                for depth in range(k + 1, len(stack) + 1):
+                    self.commas.pop(depth, None)
+                del stack[k:]
+                closed.append((start, base + j + 1, kind))
+        return closed
+
+    def text(self, start, end=None):
+        """Returns buffer[start:end] by joining only the chunks that span it."""
+        if end is None:
+            end = self.length
+        if len(self.chunks) == 1:
+            return self.chunks[0][start:end]
+        first = bisect_right(self.offsets, start) - 1
+        last = bisect_right(self.offsets, max(start, end - 1)) - 1
+        joined = "".join(self.chunks[first:last + 1])
+        base = self.offsets[first]
+        return joined[start - base:end - base]
+
+    def getvalue(self):
+        if len(self.chunks) != 1:
+            self.chunks = ["".join(self.chunks)]
+            self.offsets = [0]
+        return self.chunks[0] if self.chunks else ""
+
+    def repair_tail(self):
+        """Salvages the truncated trailing container, keeping only elements that fully closed.
+
+        Returns the parsed value, or None if nothing trustworthy can be recovered.
+        """
+        stack = self.stack
+        if not stack:
+            return None
+        start = stack[0][1]
+        candidates = []
+
+        # The stream stopped right after a complete list element: just close the brackets
+        if not self.in_string and stack[-1][0] == "[":
+            tail = self.text(start).rstrip().rstrip(",")
+            candidates.append(tail + "".join(_CLOSERS[k] for k, _ in reversed(stack)))
+
+        # Otherwise cut at the deepest list comma and drop the element that was cut off
+        for depth in sorted(self.commas, reverse=True):
+            cut = self.commas[depth]
+            if cut > start:
+                candidates.append(self.text(start, cut) + "".join(_CLOSERS[k] for k, _ in reversed(stack[:depth])))
+                break
+
+        for candidate in candidates:
+            try:
+                return json.loads(candidate)
+            except ValueError:
+                continue
+        return None
+
+
+def _next_opener(text, pos):
+    # str.find skips long stretches of prose much faster than a regex scan does
+    i, j = text.find("{", pos), text.find("[", pos)
+    if i == -1 or -1 < j < i:
+        i = j
+    return _OPENER.search(text, i) if i != -1 else None
+
+
+def heal_json(raw_text):
+    """THE ULTIMATE JSON HEALER: pulls every JSON value out of chatty model output.
+
+    Values are decoded in place with `raw_decode(text, idx)`; a broken one is retried from the
+    next opener, like the original loop but without re-slicing the buffer. A value that runs off
+    the end of the text (a truncated plan), or failures that keep re-reading long stretches, hand
+    the rest to one scanner pass that matches the brackets so each container is tried at most once.
+    """
+    decoder = json.JSONDecoder()
+    parsed_data = []
+    budget = _RETRY_BUDGET * len(raw_text)  # characters failed decodes may read before the scanner takes over
+    first_failure = None  # (offset, values parsed before it)
+
+    m = _next_opener(raw_text, 0)
+    while m:
+        start = m.start()
+        try:
+            obj, idx = decoder.raw_decode(raw_text, start)
+        except json.JSONDecodeError as e:
+            if e.pos >= len(raw_text) or e.msg.startswith("Unterminated string"):
+                # Ran off the end (a truncated plan): the scanner salvages whatever closed before that
+                return parsed_data + _scan_rest(raw_text[start:])
+            if first_failure is None:
+                first_failure = (start, len(parsed_data))
+            # What the decoder read, plus the newline count the error does up to its offset
+            budget -= e.pos - start + 1 + e.pos // 16
+            if budget < 0:
+                # Nested broken containers would be re-read once per opener: scan once instead
+                start, kept = first_failure
+                return parsed_data[:kept] + _scan_rest(raw_text[start:])
+            m = _next_opener(raw_text, start + 1)
+            continue
+        parsed_data.append(obj)
+        m = _next_opener(raw_text, idx)
+    return parsed_data
+
+
+def _scan_rest(rest):
+    """Every value the scanner can recover from `rest`, which starts at a broken opener."""
+    parsed_data = []
+    scanner = JsonScanner()
+    closed = scanner.feed(rest)
+    cursor = 0
+    for start, end in sorted((start, end) for start, end, _ in closed):
+        if start < cursor:
+            continue
+        # Decode just the matched span: a JSONDecodeError counts newlines up to the error offset,
+        # which is O(len(buffer)) per failure when decoding in place
+        try:
+            obj = json.loads(rest[start:end])
+        except ValueError:
+            continue  # Broken container: its inner values are the next openers in line
+        parsed_data.append(obj)
+        cursor = end
+
+    # A truncated trailing object never closes, so the loop above never saw it
+    if scanner.stack and scanner.stack[0][1] >= cursor:
+        salvaged = scanner.repair_tail()
+        if salvaged is not None:
+            parsed_data.append(salvaged)
+    return parsed_data
+
+
+def normalize_task(t):
+    """Maps hallucinated keys to 'target'. Returns None if the item can't be salvaged."""
+    # Salvage string commands! (e.g., "mkdir hello_flask")
+    if isinstance(t, str):
+        parts = t.split(" ", 1)
+        if len(parts) == 2 and parts[0] in ALLOWED_ACTIONS:
+            return {"action": parts[0], "target": parts[1].strip("'\"")}
+        return None
+
+    if not isinstance(t, dict): return None
+
+    if "args" in t and isinstance(t["args"], list) and len(t["args"]) > 0:
+        t["target"] = t["args"][0]
+    if "path" in t and "target" not in t:
+        t["target"] = t["path"]
+    if "file" in t and "target" not in t:
+        t["target"] = t["file"]
+    for key in ("filename", "dest", "destination", "command", "cmd"):
+        if key in t and "target" not in t:
+            t["target"] = t[key]
+
+    if "action" in t and "target" in t:
+        return t
+    return None
+
+
+def _collect_tasks(item, new_tasks, depth=0):
+    if depth > _MAX_DEPTH:
+        return
+    if isinstance(item, list):
+        for sub_item in item:
+            if isinstance(sub_item, (dict, list)) and not (isinstance(sub_item, dict) and "action" in sub_item):
+                _collect_tasks(sub_item, new_tasks, depth + 1)
+            else:
+                new_tasks.append(sub_item)
+        return
+    if not isinstance(item, dict):
+        return
+
+    if "tasks" in item and isinstance(item["tasks"], list):
+        _collect_tasks(item["tasks"], new_tasks, depth + 1)
+    elif "actions" in item and isinstance(item["actions"], list):
+        _collect_tasks(item["actions"], new_tasks, depth + 1)
+    elif "action" in item:
+        new_tasks.append(item)
+    elif any(key in ALLOWED_ACTIONS for key in item):
+        # Handles hallucinations like: {"mkdir": "folder", "write_file": [...]}
+        for key, val in item.items():
+            if key not in ALLOWED_ACTIONS:
+                continue
+            if isinstance(val, str):
+                new_tasks.append({"action": key, "target": val})
+            elif isinstance(val, list):
+                for sub_item in val:
+                    if isinstance(sub_item, str):
+                        new_tasks.append({"action": key, "target": sub_item})
+                    elif isinstance(sub_item, dict):
+                        task_obj = {"action": key}
+                        task_obj["target"] = sub_item.get("target") or sub_item.get("path") or sub_item.get("file")
+                        if "content" in sub_item:
+                            task_obj["content"] = sub_item["content"]
+                        new_tasks.append(task_obj)
+    else:
+        # Other wrapper keys ({"plan": {"tasks": [...]}}, {"response": [...]}) are searched one level down
+        for val in item.values():
+            if isinstance(val, (dict, list)):
+                _collect_tasks(val, new_tasks, depth + 1)
+
+
+def map_tasks(parsed_data):
+    """THE SCHEMA MAPPER: flattens wrapper objects into a clean list of task dicts."""
+    new_tasks = []
+    for item in parsed_data:
+        if isinstance(item, list):
+            _collect_tasks(item, new_tasks)
+        elif isinstance(item, dict):
+            _collect_tasks(item, new_tasks)
+
+    final_tasks = []
+    for t in new_tasks:
+        t = normalize_task(t)
+        if t is not None:
+            final_tasks.append(t)
+    return final_tasks
+
+
+def heal_tasks(raw_text):
+    """Healer + mapper in one call: raw model output in, list of task dicts out."""
+    return map_tasks(heal_json(raw_text))
+
+
+class TaskStreamParser:
+    """Incrementally pulls complete task objects out of a growing JSON buffer."""
+    def __init__(self):
+        self.scanner = JsonScanner()
+
+    @property
+    def buffer(self):
+        return self.scanner.getvalue()
+
+    def feed(self, chunk):
+        found = []
+        for start, end, kind in self.scanner.feed(chunk):
+            if kind != "{":
+                continue
+            try:
+                obj = json.loads(self.scanner.text(start, end))
+            except ValueError:
+                continue
+            # Only real task objects are emitted; wrappers like {"tasks": [...]} are skipped
+            if isinstance(obj, dict) and "action" in obj:
+                task = normalize_task(obj)
+                if task is not None:
+                    found.append(task)
+        return found
+
+
+def _task_schema(action, required, optional=None):
+    properties = {"action": {"type": "string", "enum": [action]}}
+    for field in required + list(optional or {}):
+        properties[field] = (optional or {}).get(field, {"type": "string"})
+    return {"type": "object", "properties": properties, "required": ["action"] + required, "additionalProperties": False}
+
+
+# Passed as Ollama's structured-output `format`: the model can only emit a valid task array
+PLAN_SCHEMA = {
+    "type": "array",
+    "items": {"anyOf": [
+        _task_schema("mkdir", ["target"]),
+        _task_schema("write_file", ["target", "content"]),
+        _task_schema("read_file", ["target"], {"offset": {"type": "integer"}, "length": {"type": "integer"}}),
+        _task_schema("run_cmd", ["target"], {"timeout": {"type": "number"}}),
+        _task_schema("copy", ["source", "target"]),
+    ]},
+}
+_SCHEMA_BY_ACTION = {s["properties"]["action"]["enum"][0]: s for s in PLAN_SCHEMA["items"]["anyOf"]}
+_JSON_TYPES = {"string": str, "integer": int, "number": (int, float)}
+
+
+def validate_task(task):
+    """True if `task` matches PLAN_SCHEMA exactly (what a schema-constrained model returns)."""
+    if not isinstance(task, dict):
+        return False
+    schema = _SCHEMA_BY_ACTION.get(task.get("action"))
+    if schema is None or any(field not in task for field in schema["required"]):
+        return False
+    for key, value in task.items():
+        spec = schema["properties"].get(key)
+        if spec is None or isinstance(value, bool) or not isinstance(value, _JSON_TYPES[spec["type"]]):
+            return False
+    return True
+
+
+def parse_plan(raw_text):
+    """Fast path for constrained output: one json.loads and a shape check, no healer.
+
+    Returns (tasks, healed). Anything that doesn't validate (an older Ollama that ignored the
+    schema, a truncated response) still goes through the full healer.
+    """
+    try:
+        data = json.loads(raw_text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and isinstance(data.get("tasks"), list):
+        data = data["tasks"]
+    if isinstance(data, list) and data and all(validate_task(t) for t in data):
+        return data, False
+    return heal_tasks(raw_text), True
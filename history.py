@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import itertools
+
+HISTORY_DIR = os.path.join(".pocketflow_cache", "history")
+PREVIEW_CHARS = 600  # what stays in memory (and on screen) of a long message
+MEMORY_ENTRIES = 60  # older entries move to an archive file and are read back only when paged to
+STALE_SECONDS = 7 * 24 * 3600  # spill folders of browser sessions that are long gone
+
+
+def _preview(text, limit=PREVIEW_CHARS):
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    if cut.count("```") % 2:
+        cut += "\n```"  # don't leave a code fence open and swallow the rest of the page
+    return cut + f"\n\n*…{len(text) - limit} more characters*"
+
+
+def _prune(folder):
+    if not os.path.isdir(folder):
+        return
+    cutoff = time.time() - STALE_SECONDS
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class ChatHistory:
+    """The web UI's conversation, kept small enough that a rerun costs the same in hour one and hour ten.
+
+    Long messages (file contents, command output) are written to disk and only a preview is kept;
+    the full text is read back when someone opens it. Each finished run is collapsed into one
+    summary card. Only the newest MEMORY_ENTRIES entries live in memory, the rest sit in an
+    append-only archive that pages are read from on demand.
+    """
+    def __init__(self, session_id="default", root=HISTORY_DIR, memory_entries=MEMORY_ENTRIES):
+        # Two tabs on the same session id each get their own folder
+        self.path = os.path.join(root, session_id, uuid.uuid4().hex[:8])
+        _prune(os.path.join(root, session_id))
+        self.memory_entries = memory_entries
+        self.entries = []
+        self.archived = 0
+        self.ids = itertools.count(1)
+
+    def __len__(self):
+        return self.archived + len(self.entries)
+
+    def _spill(self, entry_id, text):
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, f"{entry_id}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def _message(self, role, content):
+        entry = {"id": next(self.ids), "type": "message", "role": role, "content": content, "full": None}
+        if len(content) > PREVIEW_CHARS:
+            entry["full"] = self._spill(entry["id"], content)
+            entry["content"] = _preview(content)
+        return entry
+
+    def _append(self, entry):
+        self.entries.append(entry)
+        if len(self.entries) > self.memory_entries:
+            old, self.entries = self.entries[:-self.memory_entries], self.entries[-self.memory_entries:]
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, "archive.jsonl"), "a", encoding="utf-8") as f:
+                for e in old:
+                    f.write(json.dumps(e) + "\n")
+            self.archived += len(old)
+        return entry
+
+    def add(self, role, content):
+        return self._append(self._message(role, str(content)))
+
+    def add_run(self, messages, goal=None, summary=None, outcome=None):
+        """Collapses a finished run's messages into one card: the last message up front, every step inside."""
+        steps = [self._message(m.get("role", "assistant"), str(m["content"])) for m in messages]
+        headline = outcome or (steps[-1]["content"] if steps else "Nothing to report.")
+        failures = sum("❌" in s["content"] for s in steps)
+        card = {
+            "id": next(self.ids), "type": "run", "role": "assistant", "goal": goal,
+            "headline": _preview(headline, 300), "steps": steps, "failures": failures,
+            "seconds": summary["wall_seconds"] if summary else None,
+            "replans": summary["replans"] if summary else None,
+        }
+        return self._append(card)
+
+    def page(self, number, size=20):
+        """Entries on page `number`, counted back from the newest (page 0), oldest first."""
+        total = len(self)
+        end = max(0, total - number * size)
+        start = max(0, end - size)
+        if start >= self.archived:
+            return self.entries[start - self.archived:end - self.archived]
+        archived = []
+        with open(os.path.join(self.path, "archive.jsonl"), encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if i >= end:
+                    break
+                if i >= start:
+                    archived.append(json.loads(line))
+        return archived + self.entries[:max(0, end - self.archived)]
+
+    def pages(self, size=20):
+        return max(1, -(-len(self) // size))
+
+    def full_text(self, entry):
+        """The complete message, from disk if it was spilled."""
+        if entry.get("full") and os.path.exists(entry["full"]):
+            with open(entry["full"], encoding="utf-8") as f:
+                return f.read()
+        return entry["content"]
+
+    def clear(self):
+        self.entries = []
+        self.archived = 0
+        shutil.rmtree(self.path, ignore_errors=True)
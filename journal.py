@@ -0,0 +1,134 @@
+import os
+import shlex
+import hashlib
+from fileops import file_digest
+from task_graph import workspace_relpath
+
+# Commands that are safe to skip when they already succeeded earlier in the same run
+IDEMPOTENT_CMD_PREFIXES = (
+    "pip install", "pip3 install", "python -m pip install", "python3 -m pip install",
+    "npm install", "npm ci", "yarn install", "python -m venv", "python3 -m venv",
+    "mkdir -p", "touch ",
+)
+# Installs that read a file: they only count as done while that file is unchanged
+_REQUIREMENT_FLAGS = ("-r", "--requirement", "-c", "--constraint")
+_MANIFESTS = ("package.json", "package-lock.json", "yarn.lock")
+
+
+def _digest(text):
+    return hashlib.sha256(str(text).encode("utf-8")).hexdigest()[:16]
+
+
+def task_key(task):
+    """Identifies a task by what it does, so a replanned copy of a finished step can be recognised."""
+    action = task.get("action")
+    target = task.get("target") or task.get("path")
+    if action == "run_cmd":
+        return (action, " ".join(str(target).split()))
+    if action == "write_file":
+        return (action, workspace_relpath(target), _digest(task.get("content", "")))
+    if action == "copy":
+        return (action, workspace_relpath(task.get("source")), workspace_relpath(target))
+    return (action, workspace_relpath(target))
+
+
+def _input_files(cmd):
+    """Files an install command reads its package list from, or None if it can't be skipped safely."""
+    try:
+        words = shlex.split(cmd)
+    except ValueError:
+        return None
+    if cmd.startswith(("npm install", "npm ci", "yarn install")):
+        # With no package names it installs whatever the manifest says
+        return list(_MANIFESTS) if not [w for w in words[2:] if not w.startswith("-")] else []
+    if not {"pip", "pip3"} & set(words[:3]):
+        return []
+    files = []
+    words = iter(words)
+    for word in words:
+        if word in ("-e", "--editable") or word.startswith("--editable=") or word == "." or word.startswith(("./", "../", "/")):
+            return None  # a local source tree: no cheap way to tell whether it changed
+        if word in _REQUIREMENT_FLAGS:
+            files.append(next(words, None))
+        elif word.startswith(("--requirement=", "--constraint=")):
+            files.append(word.split("=", 1)[1])
+        elif word.startswith(("-r", "-c")):
+            files.append(word[2:])
+    return None if None in files else files
+
+
+def _digests(task, base_dir):
+    """What a finished step depends on right now: the files it made and the files it read."""
+    action = task.get("action")
+    paths = {}
+    if action in ("write_file", "copy"):
+        paths["target"] = task.get("target") or task.get("path")
+    if action == "copy":
+        paths["source"] = task.get("source")
+    if action == "run_cmd":
+        files = _input_files(" ".join(str(task.get("target", "")).split()))
+        if files is None:
+            return None
+        paths.update((f"input:{f}", f) for f in files)
+    digests = {}
+    for name, path in paths.items():
+        try:
+            digests[name] = file_digest(os.path.join(base_dir, workspace_relpath(path)))
+        except (OSError, TypeError, ValueError):
+            digests[name] = None  # missing: only matches if it is still missing
+    return digests
+
+
+def is_idempotent(task):
+    action = task.get("action")
+    if action in ("mkdir", "write_file", "copy"):
+        return True
+    if action == "run_cmd":
+        cmd = " ".join(str(task.get("target", "")).split())
+        return cmd.startswith(IDEMPOTENT_CMD_PREFIXES) and _input_files(cmd) is not None
+    return False  # read_file is cheap and its output is the point, so it always runs again
+
+
+def record(journal, task, result, base_dir="workspace"):
+    """Appends a successfully executed task to the run's checkpoint journal."""
+    journal.append({
+        "key": list(task_key(task)),
+        "action": task.get("action"),
+        "target": task.get("target"),
+        "source": task.get("source"),
+        "result": str(result)[:200],
+        "digests": _digests(task, base_dir),
+    })
+
+
+def find_completed(journal, task, base_dir="workspace"):
+    """Returns the journal entry this task would repeat, or None if it still has to run."""
+    if not journal or not is_idempotent(task):
+        return None
+    key = list(task_key(task))
+    for entry in journal:
+        if entry["key"] != key:
+            continue
+        # A later step (or the user) may have removed what we made, so check it's still on disk
+        if task.get("action") == "mkdir":
+            if not os.path.isdir(os.path.join(base_dir, workspace_relpath(task.get("target")))):
+                return None
+        # ...and that nothing it made or read has changed since: a rewritten copy source, a file a
+        # later run_cmd edited, a requirements.txt that gained a line
+        elif entry.get("digests") != _digests(task, base_dir):
+            return None
+        return entry
+    return None
+
+
+def describe(journal, limit=40):
+    """Renders the completed steps for the replanning prompt."""
+    lines = []
+    for entry in journal[-limit:]:
+        line = f"- {entry['action']} `{entry['target']}`"
+        if entry.get("source"):
+            line += f" (from `{entry['source']}`)"
+        lines.append(line)
+    if len(journal) > limit:
+        lines.insert(0, f"- ...and {len(journal) - limit} earlier steps")
+    return "\n".join(lines)
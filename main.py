@@ -1,4 +1,12 @@
+import sys
+import json
 from flow import build_flow
+from metrics import RunTrace
+from reporters import ConsoleReporter, JsonReporter
+
+def option(name):
+    """The value after `name` on the command line, or None."""
+    return next((sys.argv[i + 1] for i, arg in enumerate(sys.argv[:-1]) if arg == name), None)
 
 def main():
     print("🤖 Welcome to the PocketFlow CLI Assistant (Claude Code Clone)")
@@ -14,13 +22,32 @@ def main():
     # 2. Construct the graph
     app_flow = build_flow()
     
+    # `--hedge-after 20` races a slow plan against another server (OLLAMA_HOSTS) or `--hedge-model`
+    hedge_after = float(option("--hedge-after") or 0) or None
+    
     # 3. Define the starting state
     shared_state = {
-        "user_goal": user_goal
+        "user_goal": user_goal,
+        "stream_plan": hedge_after is None,  # hedging needs the whole plan, so it plans non-streamed
+        "hedge_after": hedge_after,
+        "hedge_model": option("--hedge-model"),
+        "trace": RunTrace(goal=user_goal),
+        "use_plan_cache": "--no-cache" not in sys.argv,
+        "structured_output": "--structured" in sys.argv,
+        "persistent_shell": "--shell-session" in sys.argv,
+        # `--allow "pip install *"` (repeatable) runs matching commands without asking
+        "allowlist": [sys.argv[i + 1] for i, arg in enumerate(sys.argv[:-1]) if arg == "--allow"],
+        # `--json` prints one event per line for scripts; `--yes` skips the run_cmd prompts
+        "reporter": JsonReporter() if "--json" in sys.argv else ConsoleReporter(ask_approval="--yes" not in sys.argv)
     }
     
     # 4. Execute the flow
     app_flow.run(shared_state)
 
+    # 5. Report where the time went
+    trace = shared_state["trace"]
+    print(json.dumps(trace.summary(), indent=2))
+    print(f"📊 Trace written to {trace.path}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from pocketflow import Node
+
+TRACE_DIR = os.environ.get("POCKETFLOW_TRACE_DIR", "traces")
+
+# Fields Ollama returns on the final /api/generate message; durations are in nanoseconds
+OLLAMA_STAT_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
+
+
+class RunTrace:
+    """Structured timing events for one agent run, kept in memory and appended to a JSONL file."""
+    def __init__(self, goal=None, model=None, trace_dir=TRACE_DIR):
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.path = os.path.join(trace_dir, f"{self.run_id}.jsonl") if trace_dir else None
+        self.events = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+        if self.path:
+            os.makedirs(trace_dir, exist_ok=True)
+        self.record("run_start", goal=goal, model=model)
+
+    def record(self, kind, **fields):
+        event = {"t": round(time.time() - self.started, 4), "kind": kind, **fields}
+        with self.lock:
+            self.events.append(event)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(event, default=str) + "\n")
+        return event
+
+    @contextmanager
+    def timed(self, kind, **fields):
+        """Records `kind` with its wall time once the block exits. The yielded dict can add fields."""
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            fields["seconds"] = round(time.perf_counter() - start, 4)
+            self.record(kind, **fields)
+
+    def summary(self):
+        """Aggregates the events into the numbers the metrics panel shows."""
+        with self.lock:
+            events = list(self.events)
+        nodes, tasks = {}, {}
+        llm = {"calls": 0, "prompt_tokens": 0, "eval_tokens": 0, "prompt_eval_s": 0.0, "eval_s": 0.0, "load_s": 0.0}
+        healer_s = approval_s = 0.0
+        replans = breaker_trips = plan_failures = healer_fallbacks = shell_restarts = 0
+        cache = {"hits": 0, "misses": 0}
+        approvals = {"prompts": 0, "auto": 0}
+        validation = {"repairs": 0, "rejected_plans": 0, "round_trips_saved": 0}
+        file_io = {"bytes_requested": 0, "bytes_written": 0, "unchanged": 0, "reflinked": 0}
+        endpoints, hedges_won = {}, 0
+        for e in events:
+            kind = e["kind"]
+            if kind == "node":
+                stats = nodes.setdefault(e["node"], {"runs": 0, "seconds": 0.0})
+                stats["runs"] += 1
+                stats["seconds"] += e.get("seconds", 0.0)
+            elif kind == "task":
+                stats = tasks.setdefault(e.get("action") or "unknown", {"runs": 0, "seconds": 0.0})
+                stats["runs"] += 1
+                stats["seconds"] += e.get("seconds", 0.0)
+            elif kind == "llm":
+                llm["calls"] += 1
+                llm["prompt_tokens"] += e.get("prompt_eval_count") or 0
+                llm["eval_tokens"] += e.get("eval_count") or 0
+                llm["prompt_eval_s"] += (e.get("prompt_eval_duration") or 0) / 1e9
+                llm["eval_s"] += (e.get("eval_duration") or 0) / 1e9
+                llm["load_s"] += (e.get("load_duration") or 0) / 1e9
+                if e.get("endpoint"):
+                    endpoints[e["endpoint"]] = endpoints.get(e["endpoint"], 0) + 1
+                hedges_won += bool(e.get("hedged"))
+            elif kind == "healer":
+                healer_s += e.get("seconds", 0.0)
+                healer_fallbacks += bool(e.get("healed"))
+            elif kind == "approval":
+                approval_s += e.get("seconds", 0.0)
+                approvals["auto" if e.get("auto") else "prompts"] += 1
+            elif kind == "replan":
+                replans += 1
+            elif kind == "circuit_breaker":
+                breaker_trips += 1
+            elif kind == "plan_failed":
+                plan_failures += 1
+            elif kind == "plan_cache":
+                cache["hits" if e.get("hit") else "misses"] += 1
+            elif kind == "shell_restart":
+                shell_restarts += 1
+            elif kind == "validate":
+                validation["repairs"] += e.get("repairs", 0)
+                validation["rejected_plans"] += bool(e.get("errors"))
+                validation["round_trips_saved"] += e.get("round_trips_saved", 0)
+            elif kind == "file_io":
+                file_io["bytes_requested"] += e.get("requested", 0)
+                file_io["bytes_written"] += e.get("written", 0)
+                file_io["unchanged"] += e.get("status") == "unchanged"
+                file_io["reflinked"] += e.get("status") == "reflinked"
+        llm["tokens_per_s"] = round(llm["eval_tokens"] / llm["eval_s"], 1) if llm["eval_s"] else None
+        llm["prompt_tokens_per_s"] = round(llm["prompt_tokens"] / llm["prompt_eval_s"], 1) if llm["prompt_eval_s"] else None
+        return {
+            "run_id": self.run_id,
+            "wall_seconds": round(events[-1]["t"], 3) if events else 0.0,
+            "nodes": {k: {"runs": v["runs"], "seconds": round(v["seconds"], 3)} for k, v in nodes.items()},
+            "tasks": {k: {"runs": v["runs"], "seconds": round(v["seconds"], 3)} for k, v in tasks.items()},
+            "llm": {k: round(v, 3) if isinstance(v, float) else v for k, v in llm.items()},
+            "healer_seconds": round(healer_s, 4),
+            "approval_wait_seconds": round(approval_s, 3),
+            "approvals": approvals,
+            "replans": replans,
+            "circuit_breaker_trips": breaker_trips,
+            "plan_failures": plan_failures,
+            "healer_fallbacks": healer_fallbacks,
+            "plan_cache": cache,
+            "validation": validation,
+            "shell_restarts": shell_restarts,
+            "file_io": file_io,
+            "endpoints": endpoints,
+            "hedges_won": hedges_won,
+        }
+
+
+def llm_stats(payload):
+    """Picks Ollama's timing/token counters out of a (final) /api/generate message."""
+    stats = {k: payload.get(k) for k in OLLAMA_STAT_FIELDS if payload.get(k) is not None}
+    if stats.get("eval_count") and stats.get("eval_duration"):
+        stats["tokens_per_s"] = round(stats["eval_count"] / (stats["eval_duration"] / 1e9), 1)
+    return stats
+
+
+def record(shared, kind, **fields):
+    """Records an event if the run is being traced; a no-op otherwise."""
+    trace = shared.get("trace") if shared else None
+    if trace is not None:
+        trace.record(kind, **fields)
+
+
+class TracedNode(Node):
+    """Times prep/exec/post of every node run and records them on shared['trace']."""
+    def _run(self, shared):
+        trace = shared.get("trace")
+        if trace is None:
+            return super()._run(shared)
+        event = {"node": type(self).__name__}
+        start = time.perf_counter()
+        try:
+            p = self.prep(shared)
+            event["prep"] = round(time.perf_counter() - start, 4)
+            t = time.perf_counter()
+            e = self._exec(p)
+            event["exec"] = round(time.perf_counter() - t, 4)
+            t = time.perf_counter()
+            action = self.post(shared, p, e)
+            event["post"] = round(time.perf_counter() - t, 4)
+            event["action"] = action
+            return action
+        except BaseException as exc:
+            # e.g. Streamlit's st.stop() while waiting for an approval
+            event["interrupted"] = type(exc).__name__
+            raise
+        finally:
+            event["seconds"] = round(time.perf_counter() - start, 4)
+            trace.record("node", **event)
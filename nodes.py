@@ -1,21 +1,24 @@
 import os
 import time
 import json
-import requests
 import threading
-import sys
-import itertools
-import streamlit as st
-from pocketflow import Node
-import shutil
-import subprocess
-import re
-
-if not os.path.exists("workspace"):
-    os.makedirs("workspace")
-    gitignore_path = os.path.join("workspace", ".gitignore")
-    with open(gitignore_path, "w") as f:
-        f.write("*\n!.gitignore\n")
+from healer import PLAN_SCHEMA, TaskStreamParser, heal_tasks, parse_plan
+from router import get_router
+from journal import describe as describe_journal, find_completed, record as record_completed
+from task_graph import next_batch, run_batch, workspace_relpath
+from runner import DEFAULT_CMD_TIMEOUT, ShellSession, run_streaming
+
+from prompt_builder import DEFAULT_PROMPT_BUDGET, PromptBuilder, format_report
+from fileops import WORKSPACE_DIR, copy_if_changed, ensure_workspace, read_range, write_if_changed
+from metrics import TracedNode, llm_stats, record as record_metric
+from reporters import NULL_REPORTER, get_reporter
+from plan_cache import get_plan_cache, plan_key
+from approvals import ApprovalPolicy
+from plan_validator import missing_inputs, repair_task, validate_plan, would_have_failed
+
+MAX_OBSERVATIONS = 3    # read_file results remembered for the replanning prompt
+PROMPT_TEMPLATE_VERSION = 2  # bump whenever the planning instructions change, so cached plans are not reused
+MAX_CARRIED_CONTEXT = 8192   # tokens of Ollama `context` worth carrying into a replan; beyond that start fresh
 
 def is_safe_path(target_path, base_dir):
     """Ensures the agent stays within the allowed workspace directory."""
@@ -23,154 +26,299 @@ def is_safe_path(target_path, base_dir):
         return False
     abs_base = os.path.abspath(base_dir)
     abs_target = os.path.abspath(os.path.join(abs_base, target_path))
-    return abs_target.startswith(abs_base)
+    return abs_target == abs_base or abs_target.startswith(abs_base + os.sep)
+
+def sandbox_path(path, workspace):
+    """Maps a task path ('app/x.py' or the habitual 'workspace/app/x.py') into this run's workspace.
+
+    Returns None if it would land outside of it.
+    """
+    rel = workspace_relpath(path)
+    if not is_safe_path(rel, workspace):
+        return None
+    return os.path.join(workspace, rel)
+
+class PlanStream:
+    """Reads a streaming Ollama response in the background and publishes tasks as soon as they close."""
+    def __init__(self, response, trace=None, on_done=None, cancel_event=None):
+        self.response = response
+        self.cancel_event = cancel_event  # STOP: the run's event, checked while anyone waits on the stream
+        self.trace = trace
+        self.on_done = on_done
+        self.started = time.perf_counter()
+        self.stats = {}
+        self.context = None
+        self.healed = False
+        self.parse_seconds = 0.0
+        self.tasks = []
+        self.raw_text = ""
+        self.error = None
+        self.done = False
+        self.cancelled = False
+        self.changed = threading.Condition()
+        self.thread = threading.Thread(target=self._consume, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _consume(self):
+        parser = TaskStreamParser()
+        try:
+            for line in self.response.iter_lines():
+                if self.cancelled or self._stop_requested(): break
+                if not line: continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                t = time.perf_counter()
+                found = parser.feed(chunk.get("response", ""))
+                self.parse_seconds += time.perf_counter() - t
+                if found:
+                    if not self.tasks and self.trace:
+                        self.trace.record("first_task", seconds=round(time.perf_counter() - self.started, 4))
+                    with self.changed:
+                        self.tasks.extend(found)
+                        self.changed.notify_all()
+                if chunk.get("done"):
+                    self.stats = llm_stats(chunk)
+                    self.context = chunk.get("context")
+                    break
+
+            # Formats the streaming parser can't see (bare strings, {"mkdir": [...]}) fall back to the full healer
+            if not self.tasks and not self.cancelled:
+                t = time.perf_counter()
+                self.tasks.extend(heal_tasks(parser.buffer))
+                self.healed = True
+                self.parse_seconds += time.perf_counter() - t
+        except Exception as e:
+            self.error = e
+        finally:
+            self.raw_text = parser.buffer
+            self.response.close()
+            if self.trace:
+                self.trace.record("llm", streamed=True, cancelled=self.cancelled, seconds=round(time.perf_counter() - self.started, 4), **self.stats)
+                self.trace.record("healer", streamed=True, healed=self.healed, seconds=round(self.parse_seconds, 4), chars=len(self.raw_text), tasks=len(self.tasks))
+            if self.on_done and self.tasks and not self.error and not self.cancelled:
+                self.on_done(list(self.tasks))
+            with self.changed:
+                self.done = True
+                self.changed.notify_all()
+
+    def _stop_requested(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
 
-class PlanNode(Node):
+    def _wait(self, predicate, timeout=None):
+        """Waits in short slices so that STOP cancels the stream even while nothing arrives."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.changed:
+            while not predicate():
+                if self._stop_requested():
+                    self.cancel()
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                self.changed.wait(0.2 if deadline is None else max(0.0, min(0.2, deadline - time.monotonic())))
+            return predicate()
+
+    def wait_for_task(self, index, timeout=None):
+        """Blocks until task `index` exists or the stream ends. Returns True if the task is available."""
+        self._wait(lambda: len(self.tasks) > index or self.done, timeout)
+        return len(self.tasks) > index
+
+    def wait_until_done(self, timeout=None):
+        return self._wait(lambda: self.done, timeout)
+
+    def cancel(self):
+        """Stops reading and hangs up, so Ollama stops generating and the request's slot is freed."""
+        if self.cancelled:
+            return
+        self.cancelled = True
+        try:
+            self.response.close()
+        except Exception:
+            pass
+
+class PlanNode(TracedNode):
     def prep(self, shared):
         return {
             "goal": shared.get("user_goal"),
             "tasks": shared.get("tasks"), 
             "model": shared.get("model", "gemma"),
-            "ui": shared.get("ui"),
-            "error_feedback": shared.get("error_feedback")
+            "reporter": get_reporter(shared),
+            "error_feedback": shared.get("error_feedback"),
+            "stream_plan": shared.get("stream_plan", False),
+            "journal": shared.get("journal") or [],
+            "observations": shared.get("observations") or [],
+            "prompt_budget": shared.get("prompt_budget") or DEFAULT_PROMPT_BUDGET,
+            "use_plan_cache": shared.get("use_plan_cache", True),
+            "llm_context": shared.get("llm_context") if shared.get("carry_context", True) else None,
+            "keep_alive": shared.get("keep_alive"),
+            "structured_output": shared.get("structured_output", False),
+            "session": (shared.get("session_id"), shared.get("cancel_event")),
+            "hedge": (shared.get("hedge_after"), shared.get("hedge_model")),
+            "trace": shared.get("trace")
         }
-        
+
+    def _payload(self, prompt, model):
+        # A JSON Schema `format` constrains decoding to a valid task array; "json" only promises some JSON
+        payload = {"model": model, "prompt": prompt, "format": PLAN_SCHEMA if self.structured_output else "json"}
+        if self.llm_context:
+            # Continue the conversation: the goal and the earlier plans are already evaluated in here
+            payload["context"] = self.llm_context
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _parse(self, raw_text):
+        """(tasks, healed): constrained output only needs json.loads, the rest goes through the healer."""
+        if self.structured_output:
+            return parse_plan(raw_text)
+        return heal_tasks(raw_text), True
+
+    def _accept(self, raw_text):
+        """(tasks, healed, seconds) if `raw_text` holds a plan, else None; the router keeps it for exec."""
+        parse_start = time.perf_counter()
+        tasks, healed = self._parse(raw_text)
+        return (tasks, healed, time.perf_counter() - parse_start) if tasks else None
+
     def _fetch_ollama(self, prompt, model):
-        return requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False, "format": "json"}
+        """Ollama's final message for the plan. With `hedge_after`, a slow answer is raced by a second request."""
+        return get_router().plan(
+            self._payload(prompt, model),
+            accept=self._accept,
+            hedge_after=self.hedge_after, hedge_model=self.hedge_model,
+            session=self.session_id, cancel_event=self.cancel_event,
         )
 
+    def _stream_ollama(self, prompt, model):
+        return get_router().stream(self._payload(prompt, model), session=self.session_id, cancel_event=self.cancel_event)
+
+    def _exec_streaming(self, prompt, reporter, status_container):
+        """Starts executing as soon as the first task object closes; the rest keeps streaming in."""
+        stream = PlanStream(self._stream_ollama(prompt, self.model_name), trace=self.trace, on_done=self._store_plan, cancel_event=self.cancel_event).start()
+        self.plan_stream = stream
+        status_container.write("📡 Streaming the plan, tasks will start as soon as they are found...")
+
+        # Wait for the first task (or the end of the stream), showing whatever we find along the way
+        stream.wait_for_task(0)
+        if stream.error and not stream.tasks:
+            raise stream.error
+        if not stream.tasks:
+            raise ValueError(f"No valid tasks found. Model output: {stream.raw_text[:100]}...")
+
+        for i, t in enumerate(list(stream.tasks)):
+            status_container.write(f"🔎 Found task {i + 1}: **{t.get('action')}** `{t.get('target')}`")
+        label = "✅ Plan Generated Successfully!" if stream.done else "📡 First task ready, still streaming the rest of the plan..."
+        status_container.update(label=label, state="complete", expanded=False)
+        return stream.tasks
+
+    def _store_plan(self, tasks):
+        if self.cache_key:
+            get_plan_cache().put(self.cache_key, tasks, goal=self.goal, model=self.model_name)
+
     def exec(self, prep_data):
-        goal, tasks, model_name, ui, error_feedback = prep_data.values()
+        goal, tasks, model_name, reporter, error_feedback, stream_plan, journal, observations, prompt_budget, use_plan_cache, llm_context, self.keep_alive, self.structured_output, (self.session_id, self.cancel_event), (self.hedge_after, self.hedge_model), self.trace = prep_data.values()
         if tasks is not None: return tasks
+        self.goal = goal
+        self.model_name = model_name
+        self.plan_stream = None
+        self.prompt_report = None
+        self.cache_key = None
+        self.context_out = None
+        # Only a replan continues the previous conversation, and only while it still fits
+        self.llm_context = llm_context if error_feedback and llm_context and len(llm_context) <= MAX_CARRIED_CONTEXT else None
+
+        status_container = reporter.status(f"🤖 **Assistant is thinking ({model_name})...**")
 
-        if ui:
-            status_container = ui.status(f"🤖 **Assistant is thinking ({model_name})...**", expanded=True)
-            status_container.write("🧠 Analyzing goal and breaking down steps...")
+        # --- PLAN CACHE: the same goal (and the same failure) on the same model gets the same plan ---
+        if use_plan_cache:
+            context = {"completed": [entry["key"] for entry in journal], "observations": observations} if error_feedback else None
+            self.cache_key = plan_key(goal, model_name, PROMPT_TEMPLATE_VERSION, error_feedback, context)
+            cached = get_plan_cache().get(self.cache_key)
+            if self.trace: self.trace.record("plan_cache", hit=bool(cached))
+            if cached:
+                status_container.update(label=f"♻️ Reused a cached plan ({len(cached)} tasks)", state="complete", expanded=False)
+                return cached
 
-        # --- Inside PlanNode.exec in nodes.py ---
+        status_container.write("🧠 Analyzing goal and breaking down steps...")
 
-# Update the prompt to include 'read_file'
-        prompt = f"""Goal: {goal}.
-        Respond ONLY with a JSON array of task objects. DO NOT use plain strings.
+        # Every section goes through the PromptBuilder so huge goals, tracebacks or file dumps
+        # can't blow the context window: only the instructions are guaranteed to be sent whole
+        builder = PromptBuilder(prompt_budget)
+        if not error_feedback:
+            builder.add("goal", f"Goal: {goal}.")
+            builder.add("instructions", """Respond ONLY with a JSON array of task objects. DO NOT use plain strings.
         
         CRITICAL RULES:
         1. If the user asks to *write a script* (bash, python, etc.), use 'write_file' to generate the code. DO NOT execute the actions the script is supposed to do using your own tools.
         2. Always use full paths (e.g., 'folder_name/file.txt').
         3. NO SHORTCUTS: You must complete every single step of the user's goal sequentially. If the user asks for multiple files (e.g., a Python script AND a Bash script), you MUST generate a separate 'write_file' task for EACH one. Do not skip writing the code to just hallucinate the final output.
         
-        Example: [{{"action": "mkdir", "target": "my_app"}}, {{"action": "write_file", "target": "my_app/script.sh", "content": "#!/bin/bash\\ncp a b"}}]
-        Allowed actions: mkdir, write_file, read_file, run_cmd, copy."""
+        Example: [{"action": "mkdir", "target": "my_app"}, {"action": "write_file", "target": "my_app/script.sh", "content": "#!/bin/bash\\ncp a b"}]
+        Allowed actions: mkdir, write_file, read_file, run_cmd, copy.""", truncatable=False)
 
         # 2. Update the error feedback prompt to remind it of the JSON schema
-        if error_feedback:
-            prompt = f"""User Goal: {goal}
-            The agent encountered an error: {error_feedback}
-            
-            CRITICAL: You MUST respond ONLY with a JSON array of task objects to fix this.
-            Example: [{{"action": "write_file", "target": "fixed_file.txt", "content": "..."}}]
+        else:
+            builder.add("error", f"The agent encountered an error: {error_feedback}")
+            if self.llm_context:
+                # The goal, the rules and the failed plan are already in the carried context
+                builder.add("instructions", """Respond ONLY with a NEW JSON array of task objects (same format as before) that fixes this.
+            Use 'read_file' (with "offset"/"length" for large files) to inspect code before fixing it.""", truncatable=False)
+            else:
+                builder.add("goal", f"User Goal: {goal}")
+                builder.add("instructions", """CRITICAL: You MUST respond ONLY with a JSON array of task objects to fix this.
+            Example: [{"action": "write_file", "target": "fixed_file.txt", "content": "..."}]
             Allowed actions: mkdir, write_file, read_file, run_cmd, copy.
             
             You can use 'read_file' to inspect the code you wrote before trying to fix it.
-            Provide a NEW JSON task list to resolve the issue."""
+            For large files add "offset" and "length" (in bytes) to read_file to see just that part.
+            Provide a NEW JSON task list to resolve the issue.""", truncatable=False)
+
+            # 3. Resume from the failure instead of restarting: tell the model what already succeeded
+            if journal:
+                builder.add("completed", "These steps ALREADY SUCCEEDED in this run. Do NOT repeat them, only plan the remaining work:\n" + describe_journal(journal))
+            if observations:
+                builder.add("file_reads", "Files you inspected with read_file:\n\n" + "\n\n".join(observations))
+
+        prompt, self.prompt_report = builder.build()
+        status_container.caption(format_report(self.prompt_report, prompt_budget) + (f" + {len(self.llm_context)} tokens of carried context" if self.llm_context else ""))
 
         try:
-            response = self._fetch_ollama(prompt, model_name)
-            if ui: status_container.write("📋 Formatting the plan into actionable steps...")
-            
-            raw_text = response.json().get("response", "[]")
-            
-            # --- THE ULTIMATE JSON HEALER ---
-            decoder = json.JSONDecoder()
-            parsed_data = []
-            text_to_parse = raw_text
+            if stream_plan:
+                return self._exec_streaming(prompt, reporter, status_container)
+
+            llm_start = time.perf_counter()
+            payload = self._fetch_ollama(prompt, model_name)
+            if payload.get("hedged"):
+                status_container.write(f"🏎️ The hedge won: plan from `{payload.get('model')}` at {payload.get('endpoint')}")
+            status_container.write("📋 Formatting the plan into actionable steps...")
             
-            while text_to_parse:
-                start_dict = text_to_parse.find('{')
-                start_list = text_to_parse.find('[')
-                
-                starts = [i for i in (start_dict, start_list) if i != -1]
-                if not starts:
-                    break 
-                    
-                start_idx = min(starts)
-                text_to_parse = text_to_parse[start_idx:]
-                
-                try:
-                    obj, idx = decoder.raw_decode(text_to_parse)
-                    parsed_data.append(obj)
-                    text_to_parse = text_to_parse[idx:] 
-                except json.JSONDecodeError:
-                    text_to_parse = text_to_parse[1:]
-                    
-            # --- THE SCHEMA MAPPER (Fixes the errors in your screenshots) ---
-            new_tasks = []
-            for item in parsed_data:
-                if isinstance(item, list):
-                    new_tasks.extend(item)
-                elif isinstance(item, dict):
-                    if "tasks" in item and isinstance(item["tasks"], list):
-                        new_tasks.extend(item["tasks"])
-                    # 👇 ADD THIS ELIF BLOCK to catch the "actions" wrapper 👇
-                    elif "actions" in item and isinstance(item["actions"], list):
-                        new_tasks.extend(item["actions"])
-                    elif "action" in item:
-                        new_tasks.append(item)
-                    else:
-                        # Handles hallucinations like: {"mkdir": "folder", "write_file": [...]}
-                        for key, val in item.items():
-                            if key in ["mkdir", "write_file", "read_file", "run_cmd","copy"]:
-                                if isinstance(val, str):
-                                    new_tasks.append({"action": key, "target": val})
-                                elif isinstance(val, list):
-                                    for sub_item in val:
-                                        if isinstance(sub_item, str):
-                                            new_tasks.append({"action": key, "target": sub_item})
-                                        elif isinstance(sub_item, dict):
-                                            task_obj = {"action": key}
-                                            task_obj["target"] = sub_item.get("target") or sub_item.get("path") or sub_item.get("file")
-                                            if "content" in sub_item:
-                                                task_obj["content"] = sub_item["content"]
-                                            new_tasks.append(task_obj)
-
-            # Map remaining hallucinated keys to 'target'
-            final_tasks = []
-            for t in new_tasks:
-                # NEW: Salvage string commands! (e.g., "mkdir hello_flask")
-                if isinstance(t, str):
-                    parts = t.split(" ", 1)
-                    if len(parts) == 2 and parts[0] in ["mkdir", "write_file", "read_file", "run_cmd","copy"]:
-                        final_tasks.append({"action": parts[0], "target": parts[1].strip("'\"")})
-                    continue 
-
-                if not isinstance(t, dict): continue
-
-                if "args" in t and isinstance(t["args"], list) and len(t["args"]) > 0:
-                    t["target"] = t["args"][0]
-                if "path" in t and "target" not in t:
-                    t["target"] = t["path"]
-                if "file" in t and "target" not in t:
-                    t["target"] = t["file"]
-                    
-                if "action" in t and "target" in t:
-                    final_tasks.append(t)
+            if self.trace:
+                self.trace.record("llm", streamed=False, seconds=round(time.perf_counter() - llm_start, 4), endpoint=payload.get("endpoint"), hedged=bool(payload.get("hedged")), **llm_stats(payload))
+            raw_text = payload.get("response", "[]")
+            # A context from the smaller hedge model means nothing to the selected one
+            self.context_out = payload.get("context") if payload.get("model", model_name) == model_name else None
+            # The router already parsed the plan it accepted; anything else had no plan in it
+            final_tasks, healed, parse_seconds = payload.get("parsed") or ([], True, 0.0)
+            if self.trace:
+                self.trace.record("healer", streamed=False, healed=healed, seconds=round(parse_seconds, 4), chars=len(raw_text), tasks=len(final_tasks))
             
             if not final_tasks:
                 raise ValueError(f"No valid tasks found. Model output: {raw_text[:100]}...")
+            self._store_plan(final_tasks)
                 
-            if ui:
-                status_container.update(label="✅ Plan Generated Successfully!", state="complete", expanded=False)
+            status_container.update(label="✅ Plan Generated Successfully!", state="complete", expanded=False)
                 
             return final_tasks
             
         except Exception as e:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                status_container.update(label="🛑 Planning stopped", state="error")
+                return []  # whoever pressed STOP has already said so
+            if self.trace: self.trace.record("plan_failed", error=str(e)[:300])
             err_msg = f"❌ Planning Failed: {str(e)}"
-            if ui: 
-                status_container.update(label="❌ Planning Failed", state="error")
-                ui.error(err_msg)
-            if "messages" in st.session_state:
-                st.session_state.messages.append({"role": "assistant", "content": err_msg})
+            status_container.update(label="❌ Planning Failed", state="error")
+            reporter.message(err_msg, "error")
             return []
 
     def post(self, shared, prep_res, tasks):
@@ -179,38 +327,258 @@ class PlanNode(Node):
             shared["current_index"] = 0
             if "error_feedback" in shared: del shared["error_feedback"]
             
-            ui = shared.get("ui")
+            reporter = get_reporter(shared)
+            plan_stream = getattr(self, "plan_stream", None)
+            shared["plan_stream"] = plan_stream
+            shared["prompt_report"] = getattr(self, "prompt_report", None)
+            shared["plan_cache_key"] = getattr(self, "cache_key", None)
+            # A streamed plan's context only arrives at the end; ExecuteNode picks it up from the stream
+            shared["llm_context"] = getattr(self, "context_out", None)
+            announced = list(tasks or [])  # snapshot: a streaming plan keeps growing in the background
+            shared["plan_announced"] = len(announced)
+            shared["plan_checked"] = False
+            shared["plan_validated"] = None
             if tasks:
-                task_str = "\n".join([f"* **{t.get('action', 'unknown')}**: `{t.get('target', 'unknown')}`" for t in tasks])
+                task_str = "\n".join([f"* **{t.get('action', 'unknown')}**: `{t.get('target', 'unknown')}`" for t in announced])
                 history_msg = f"📋 **Plan Generated:**\n{task_str}"
+                if plan_stream and not plan_stream.done:
+                    history_msg += "\n* _...more tasks are still streaming in_"
+                reporter.message(history_msg)
+            elif not (self.cancel_event is not None and self.cancel_event.is_set()):
+                reporter.message("❌ No valid tasks were generated by the model.", "error")
                 
-                if "messages" in st.session_state:
-                    st.session_state.messages.append({"role": "assistant", "content": history_msg})
-                if ui: ui.markdown(history_msg)
-            else:
-                msg = "❌ No valid tasks were generated by the model."
-                if "messages" in st.session_state:
-                    st.session_state.messages.append({"role": "assistant", "content": msg})
-                if ui: ui.error(msg)
-                
         return "next_task"
 
-class ExecuteNode(Node):
+def shell_session(shared, workspace):
+    """The run's persistent shell if `persistent_shell` is on (and the platform has one), else None."""
+    session = shared.get("shell_session")
+    if not shared.get("persistent_shell") or not ShellSession.available():
+        return None
+    if session is None or session.workspace != os.path.realpath(workspace):
+        if session is not None:
+            session.close()
+        session = shared["shell_session"] = ShellSession(workspace)
+    return session
+
+def close_shell(shared):
+    if shared.get("shell_session"):
+        shared.pop("shell_session").close()
+
+def close_plan_stream(shared):
+    """Hangs up on a plan that is still streaming in; the run is done with it."""
+    plan_stream = shared.get("plan_stream")
+    if plan_stream is not None:
+        if plan_stream.done and plan_stream.context:
+            shared["llm_context"] = plan_stream.context
+        if not plan_stream.done:
+            plan_stream.cancel()
+        shared["plan_stream"] = None
+
+def is_failure(result):
+    return "Error" in str(result) or "❌" in str(result)
+
+def forget_plan(shared):
+    """A plan that hit an error must not be served from the cache again."""
+    if shared.get("plan_cache_key"):
+        get_plan_cache().invalidate(shared["plan_cache_key"])
+        shared["plan_cache_key"] = None
+
+def stop_requested(shared):
+    """True once STOP was pressed. The flow then winds down instead of running or replanning anything."""
+    cancel_event = shared.get("cancel_event")
+    return cancel_event is not None and cancel_event.is_set()
+
+def request_replan(shared, error, **fields):
+    """Sends `error` back to the PlanNode, or gives up once the circuit breaker trips. Returns the flow action."""
+    if stop_requested(shared):
+        return "done"
+    reporter = get_reporter(shared)
+    # --- THE CIRCUIT BREAKER ---
+    retries = shared.get("retry_count", 0)
+    max_retries = 3
+
+    if retries >= max_retries:
+        # We've tried too many times. Kill the process and move to SummaryNode.
+        fatal_msg = f"🛑 **Agent Stopped:** Reached maximum replan attempts ({max_retries}/{max_retries}) without resolving the issue."
+        reporter.message(fatal_msg, "error")
+
+        shared["tasks"] = None # Setting this to None forces SummaryNode into its failure state
+        shared["error_feedback"] = error
+        record_metric(shared, "circuit_breaker", retries=retries, error=str(error)[:300], **fields)
+        close_plan_stream(shared)
+        forget_plan(shared)
+        return "done"
+
+    # If under the limit, increment the counter and replan!
+    shared["retry_count"] = retries + 1
+    reporter.notice(f"⚠️ Encountered an error. Replanning to fix it... (Attempt {shared['retry_count']}/{max_retries})", "warning")
+
+    shared["error_feedback"] = error
+    shared["tasks"] = None
+    shared["current_index"] = 0
+    record_metric(shared, "replan", attempt=shared["retry_count"], error=str(error)[:300], **fields)
+    # Stop reading the rest of a plan we're about to throw away
+    close_plan_stream(shared)
+    forget_plan(shared)
+    return "replan"
+
+class ValidateNode(TracedNode):
+    """Checks a fresh plan before anything runs: fixes what it can, and sends everything else
+    back to the planner as one error instead of one failed execution per problem."""
+    def prep(self, shared):
+        tasks = shared.get("tasks")
+        plan_stream = shared.get("plan_stream")
+        return {
+            "tasks": tasks,
+            "plan_stream": plan_stream,
+            # Each plan is checked once; PlanNode clears the flag whenever it makes a new one
+            "enabled": shared.get("validate_plan", True) and not shared.get("plan_checked", False),
+            "workspace": ensure_workspace(shared.get("workspace") or WORKSPACE_DIR),
+            "trace": shared.get("trace")
+        }
+
+    def exec(self, prep_data):
+        tasks, plan_stream, enabled, workspace, trace = prep_data.values()
+        if not tasks or not enabled:
+            return None
+        started = time.perf_counter()
+        resolve = lambda path: sandbox_path(path, workspace)
+        if plan_stream is not None:
+            # A step that needs a file nobody has written yet would just fail: wait for the rest of the
+            # plan (the file may be created further down) rather than run it and replan
+            if not plan_stream.done and missing_inputs([repair_task(t)[0] for t in list(tasks)], resolve):
+                plan_stream.wait_until_done()
+            # The stream keeps appending to the same list, so repair it in place under its lock
+            with plan_stream.changed:
+                complete = plan_stream.done
+                repaired, repairs, errors = validate_plan(list(tasks), resolve, complete=complete)
+                tasks[:len(repaired)] = repaired
+        else:
+            complete = True
+            repaired, repairs, errors = validate_plan(tasks, resolve)
+            tasks[:] = repaired
+        # A task whose step would have failed is an execute-fail-replan round trip saved (renamed fields
+        # would not have failed), and N problems reported together cost one round trip instead of N
+        saved = len({r.split(":")[0] for r in repairs if would_have_failed(r)}) + max(0, len(errors) - 1)
+        if trace:
+            trace.record("validate", tasks=len(repaired), complete=complete, repairs=len(repairs), errors=len(errors), round_trips_saved=saved, seconds=round(time.perf_counter() - started, 4))
+        return {"checked": len(repaired), "repairs": repairs, "errors": errors}
+
+    def post(self, shared, prep_res, report):
+        if report is None:
+            return "next_task"
+        shared["plan_checked"] = True
+        shared["plan_validated"] = report["checked"]
+        reporter = get_reporter(shared)
+        if report["repairs"]:
+            reporter.notice("🔧 Repaired the plan before running it:\n" + "\n".join(f"* {r}" for r in report["repairs"]), "caption")
+        if report["errors"]:
+            error = "The plan was rejected before running anything:\n" + "\n".join(f"- {e}" for e in report["errors"])
+            reporter.message(f"🚫 {error}", "error")
+            return request_replan(shared, error, static=True)
+        return "next_task"
+
+class ExecuteNode(TracedNode):
     def prep(self, shared):
         tasks = shared.get("tasks", [])
         index = shared.get("current_index", 0)
-        
-        if not tasks or index >= len(tasks):
-            return {"error": "End of plan", "ui": shared.get("ui")}
-            
-        return {"task": tasks[index], "index": index, "ui": shared.get("ui")}
+        reporter = get_reporter(shared)
+
+        # Streaming plan: the next task may not have closed yet, so wait for it
+        plan_stream = shared.get("plan_stream")
+        if tasks and plan_stream and index >= len(tasks) and not plan_stream.done:
+            reporter.notice("📡 Waiting for the next task to stream in...", "caption")
+            plan_stream.wait_for_task(index)
+            if plan_stream.error and index >= len(tasks):
+                reporter.notice(f"⚠️ The plan stream ended early: {plan_stream.error}", "warning")
+
+        if not tasks or index >= len(tasks) or stop_requested(shared):
+            return {"error": "End of plan"}
+        # Tasks that streamed in after ValidateNode looked at the plan still get the per-task repairs
+        validated = shared.get("plan_validated")
+        if validated is not None and validated < len(tasks):
+            for i in range(max(validated, index), len(tasks)):
+                tasks[i] = repair_task(tasks[i])[0]
+            shared["plan_validated"] = len(tasks)
+        workspace = ensure_workspace(shared.get("workspace") or WORKSPACE_DIR)
+        # Lives for the whole run, so approvals survive replans (and Streamlit reruns)
+        if shared.get("approvals") is None:
+            shared["approvals"] = ApprovalPolicy(shared.get("allowlist"))
+        approvals = shared["approvals"]
+
+        # Independent file operations are scheduled together; run_cmd always runs on its own
+        workers = shared.get("parallel_workers", 4)
+        batch = next_batch(tasks, index) if workers > 1 else [index]
+
+        if plan_stream and shared.get("plan_announced", 0) <= batch[-1]:
+            for i in batch:
+                if i >= shared.get("plan_announced", 0):
+                    reporter.notice(f"🔎 Found task {i + 1}: **{tasks[i].get('action')}** `{tasks[i].get('target')}`", "caption")
+
+        return {
+            "tasks": [tasks[i] for i in batch],
+            "index": index,
+            "reporter": reporter,
+            "journal": shared.get("journal") or [],
+            "workers": workers,
+            "cmd_timeout": shared.get("cmd_timeout") or DEFAULT_CMD_TIMEOUT,
+            "cancel_event": shared.get("cancel_event"),
+            "trace": shared.get("trace"),
+            "workspace": workspace,
+            "shell": shell_session(shared, workspace),
+            "approvals": approvals,
+            "pending_commands": [t.get("target") for t in tasks[index:] if isinstance(t, dict) and t.get("action") == "run_cmd"]
+        }
 
     def exec(self, prep_data):
         if "error" in prep_data:
             return "Done"
             
-        task, index, ui = prep_data.values()
+        tasks, index = prep_data["tasks"], prep_data["index"]
+        reporter, journal = prep_data["reporter"], prep_data["journal"]
+        self.cmd_timeout = prep_data["cmd_timeout"]
+        self.cancel_event = prep_data["cancel_event"]
+        self.trace = prep_data["trace"]
+        self.workspace = prep_data["workspace"]
+        self.shell = prep_data["shell"]
+        self.approvals = prep_data["approvals"]
+        self.pending_commands = prep_data["pending_commands"]
+        if len(tasks) == 1:
+            return [self._timed_task(tasks[0], index, reporter, journal)]
+        # Worker threads stay quiet; their results are reported in order by post()
+        return run_batch(
+            tasks,
+            lambda task: self._timed_task(task, None, NULL_REPORTER, journal),
+            max_workers=prep_data["workers"],
+            is_failure=is_failure,
+            first_index=index,
+        )
+
+    def _timed_task(self, task, index, reporter, journal):
+        if self.trace is None:
+            return self._run_task(task, index, reporter, journal)
+        action = task.get("action") if isinstance(task, dict) else None
+        with self.trace.timed("task", action=action, target=str(task.get("target"))[:120] if action else None) as event:
+            result = self._run_task(task, index, reporter, journal)
+            event["ok"] = not is_failure(result)
+            event["skipped"] = str(result).startswith(("⏭️ Skipped", "⏸️ Not run"))
+            return result
+
+    def _cmd_timeout(self, task):
+        """A task's own 'timeout' wins over the plan-wide setting."""
+        try:
+            return float(task.get("timeout") or self.cmd_timeout)
+        except (TypeError, ValueError):
+            return self.cmd_timeout
+
+    def _run_task(self, task, index, reporter, journal):
+        """Runs one task and returns its result text. Worker threads get the silent NULL_REPORTER."""
         if isinstance(task, str): return "Skipped text description."
+
+        # --- CHECKPOINT: a replan re-emitted a step that already succeeded this run ---
+        completed = find_completed(journal, task, self.workspace)
+        if completed:
+            return f"⏭️ Skipped: already completed earlier in this run ({completed['result'].splitlines()[0] if completed['result'] else completed['action']})."
         
         action = task.get("action")
         target = str(task.get("target") or task.get("path", "unknown"))
@@ -218,25 +586,20 @@ class ExecuteNode(Node):
         # --- PATH FIX: Only modify the target if it's a file operation! ---
         # Ensure read_file also stays inside the sandbox
         if action in ["mkdir", "write_file", "read_file","copy"]:
-            if not target.startswith("workspace"):
-                target = os.path.join("workspace", target)
-            
-            if not is_safe_path(target, "workspace"):
+            safe_target = sandbox_path(target, self.workspace)
+            if safe_target is None:
                  return f"❌ SECURITY ERROR: Access to '{target}' is denied."
+            target = safe_target
         # ------------------------------------------------------------------
 
         if action == "run_cmd":
-            if ui:
-                approval_key = f"approve_{index}"
-                if not st.session_state.get(approval_key):
-                    ui.warning(f"⚠️ **Approval Required**: Run `{target}`?")
-                    col1, col2 = ui.columns(2)
-                    if col1.button("✅ Approve", key=f"btn_app_{index}"):
-                        st.session_state[approval_key] = True
-                        st.rerun() 
-                    if col2.button("❌ Deny", key=f"btn_deny_{index}"):
-                        return "❌ Action denied by user."
-                    st.stop() 
+            # Allowlisted commands go straight through; otherwise the reporter asks (and waits for
+            # the answer) whoever is watching
+            pattern = self.approvals.matching_pattern(target)
+            if pattern:
+                if self.trace: self.trace.record("approval", command=target, seconds=0.0, auto=pattern)
+            elif not reporter.approve(target, trace=self.trace, approvals=self.approvals, pending=self.pending_commands):
+                return "❌ Action denied by user."
 
         try:
             if action == "mkdir":
@@ -244,18 +607,21 @@ class ExecuteNode(Node):
                 return f"Created directory: {target}"
             
             elif action == "write_file":
-                os.makedirs(os.path.dirname(target), exist_ok=True)
-                with open(target, "w") as f: 
-                    f.write(task.get("content", ""))
+                # Identical content is left alone, so a replan doesn't bump mtimes for nothing
+                status, written, requested = write_if_changed(target, task.get("content", ""))
+                if self.trace: self.trace.record("file_io", action=action, status=status, written=written, requested=requested)
+                if status == "unchanged":
+                    return f"Unchanged file: {target} (already has this content)"
                 return f"Wrote file: {target}"
 
             # --- NEW TOOL: READ_FILE ---
             elif action == "read_file":
                 if not os.path.exists(target):
                     return f"❌ Error: File '{target}' does not exist."
-                with open(target, "r") as f:
-                    content = f.read()
-                return f"Content of {target}:\n\n{content}"
+                # Ranged reads ("offset"/"length" in bytes); big files come back as head + tail
+                content, size, note = read_range(target, task.get("offset", 0), task.get("length"))
+                header = f"Content of {target}" + (f" ({note})" if note else "")
+                return f"{header}:\n\n{content}"
             
             elif action == "copy":
                 source = task.get("source")
@@ -263,29 +629,36 @@ class ExecuteNode(Node):
                     return "❌ Error: 'copy' action requires a 'source' parameter."
                 
                 # Make sure the source path is safe and inside the workspace
-                if not source.startswith("workspace"):
-                    source = os.path.join("workspace", source)
-                if not is_safe_path(source, "workspace"):
+                safe_source = sandbox_path(source, self.workspace)
+                if safe_source is None:
                     return f"❌ SECURITY ERROR: Access to source '{source}' is denied."
+                source = safe_source
                     
                 if not os.path.exists(source):
                     return f"❌ Error: Source file '{source}' does not exist."
                     
-                # Create the destination directory if it doesn't exist, then copy
-                os.makedirs(os.path.dirname(target), exist_ok=True)
-                shutil.copy2(source, target)
+                status, written, requested = copy_if_changed(source, target)
+                if self.trace: self.trace.record("file_io", action=action, status=status, written=written, requested=requested)
+                if status == "unchanged":
+                    return f"Unchanged file: {target} (already a copy of {source})"
                 return f"Copied {source} to {target}"
 
             elif action == "run_cmd":
-                res = subprocess.run(
-                    target, 
-                    shell=True, 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=30,
-                    cwd="workspace"
+                timeout = self._cmd_timeout(task)
+                live = reporter.live_command(target)
+                # One long-lived shell keeps cd/export/venv between commands; otherwise a fresh one each time
+                run = self.shell.run if self.shell else lambda cmd, **kwargs: run_streaming(cmd, cwd=self.workspace, **kwargs)
+                restarts = self.shell.restarts if self.shell else 0
+                res = run(
+                    target, timeout=timeout,
+                    on_line=live.line if live else None,
+                    on_idle=live.idle if live else None,
+                    cancel_event=self.cancel_event,
                 )
-                return res.stdout if res.returncode == 0 else f"Error: {res.stderr}"
+                if self.shell and self.trace and self.shell.restarts > max(restarts, 0):
+                    self.trace.record("shell_restart", restarts=self.shell.restarts)
+                if live: live.finish(res)
+                return res.describe(timeout)
             
             else:
                 return f"❌ Error: Unknown action '{action}'. You must only use allowed actions (mkdir, write_file, read_file, run_cmd)."
@@ -293,82 +666,70 @@ class ExecuteNode(Node):
         except Exception as e:
             return f"❌ Error: {str(e)}"
 
-    def post(self, shared, prep_res, result):
-        if result == "Done":
+    def post(self, shared, prep_res, results):
+        if results == "Done":
             return "done"
-            
-        if result is None:
-            result = "❌ Error: Execution returned no result."
 
-        task = shared["tasks"][shared["current_index"]]
-        ui = shared.get("ui")
-        
-        history_msg = f"⚙️ **Executed:** `{task.get('action')}` on `{task.get('target', task.get('source', 'unknown'))}`\n✅ **Result:**\n```text\n{result}\n```"
-        
-        if "messages" in st.session_state:
-            st.session_state.messages.append({"role": "assistant", "content": history_msg})
-        if ui: ui.markdown(history_msg)
+        reporter = get_reporter(shared)
+        first_error = None
+        for offset, result in enumerate(results):
+            if result is None:
+                result = "❌ Error: Execution returned no result."
+            task = shared["tasks"][shared["current_index"] + offset]
+
+            # Results are reported in plan order, however the thread pool finished them
+            history_msg = f"⚙️ **Executed:** `{task.get('action')}` on `{task.get('target', task.get('source', 'unknown'))}`\n✅ **Result:**\n```text\n{result}\n```"
+            reporter.message(history_msg)
+
+            if is_failure(result):
+                if first_error is None: first_error = result
+            elif isinstance(task, dict) and task.get("action") == "read_file" and str(result).startswith("Content of"):
+                # What the model asked to see goes back to it on the next replan (only the latest few)
+                shared["observations"] = (shared.get("observations") or [])[-(MAX_OBSERVATIONS - 1):] + [result]
+            elif isinstance(task, dict) and not str(result).startswith(("⏭️ Skipped", "⏸️ Not run")):
+                # Checkpoint it so a later replan can resume from here instead of starting over
+                record_completed(shared.setdefault("journal", []), task, result, shared.get("workspace") or WORKSPACE_DIR)
 
         # Did we hit an error?
-        if "Error" in str(result) or "❌" in str(result):
-            # --- THE CIRCUIT BREAKER ---
-            retries = shared.get("retry_count", 0)
-            max_retries = 3
-            
-            if retries >= max_retries:
-                # We've tried too many times. Kill the process and move to SummaryNode.
-                fatal_msg = f"🛑 **Agent Stopped:** Reached maximum replan attempts ({max_retries}/{max_retries}) without resolving the issue."
-                if ui: ui.error(fatal_msg)
-                if "messages" in st.session_state:
-                    st.session_state.messages.append({"role": "assistant", "content": fatal_msg})
-                
-                shared["tasks"] = None # Setting this to None forces SummaryNode into its failure state
-                shared["error_feedback"] = result
-                return "done" 
-            
-            # If under the limit, increment the counter and replan!
-            shared["retry_count"] = retries + 1
-            if ui: 
-                ui.warning(f"⚠️ Encountered an error. Replanning to fix it... (Attempt {shared['retry_count']}/{max_retries})")
-            
-            shared["error_feedback"] = result
-            shared["tasks"] = None 
-            shared["current_index"] = 0 
-            return "replan"
+        if first_error is not None:
+            return request_replan(shared, first_error)
 
         # If the task succeeded, reset the retry counter for the next task!
         shared["retry_count"] = 0 
 
-        shared["current_index"] += 1
+        shared["current_index"] += len(results)
+        plan_stream = shared.get("plan_stream")
+        if plan_stream and not plan_stream.done:
+            return "next_task"
         return "next_task" if shared["current_index"] < len(shared["tasks"]) else "done"
 
-class SummaryNode(Node):
-    def prep(self, shared): return {"tasks": shared.get("tasks", []), "ui": shared.get("ui"), "error_feedback": shared.get("error_feedback")}
+class SummaryNode(TracedNode):
+    def prep(self, shared): return {"tasks": shared.get("tasks", []), "reporter": get_reporter(shared), "error_feedback": shared.get("error_feedback"), "stopped": stop_requested(shared)}
     
     def exec(self, data):
-        ui = data["ui"]
+        reporter = data["reporter"]
         tasks = data["tasks"]
         error_feedback = data.get("error_feedback")
+        if data["stopped"]:
+            return "Stopped"  # whoever pressed STOP has already said so
         
         # Logical Fallback: If we failed to get tasks or encountered a fatal error
         if not tasks:
             msg = "⚠️ I couldn't generate a valid technical plan for that request. Could you clarify or break down your goal?"
             if error_feedback:
                 msg += f"\n\n**Details:** {error_feedback}"
-                
-            if ui: ui.warning(msg)
-            if "messages" in st.session_state:
-                st.session_state.messages.append({"role": "assistant", "content": msg})
+
+            reporter.message(msg, "warning")
             return "Complete"
             
         # Success state
         msg = f"🎉 All {len(tasks)} operations completed successfully!"
-        if ui: 
-            ui.success(msg)
-            ui.balloons()
-            
-        if "messages" in st.session_state:
-            st.session_state.messages.append({"role": "assistant", "content": msg})
+        reporter.message(msg, "success")
+        reporter.celebrate()
         return "Complete"
         
-    def post(self, shared, p, e): pass
\ No newline at end of file
+    def post(self, shared, p, e):
+        close_shell(shared)
+        close_plan_stream(shared)
+        stopped = stop_requested(shared)
+        record_metric(shared, "run_end", success=bool(shared.get("tasks")) and not stopped, stopped=stopped, retries=shared.get("retry_count", 0))
\ No newline at end of file
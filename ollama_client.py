@@ -0,0 +1,221 @@
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from scheduler import FairScheduler
+
+OLLAMA_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+
+
+class TTLCache:
+    """Caches one value per key. Stale values are served instantly while a background thread refreshes them."""
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}       # key -> (value, fetched_at)
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                stale = None
+            elif time.monotonic() - entry[1] < self.ttl:
+                return entry[0]
+            else:
+                stale = entry
+                if key not in self.refreshing:
+                    self.refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+
+        if stale is not None:
+            return stale[0]
+        # First call for this key: nothing to serve yet, so this one has to block
+        value = loader()
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+            with self.lock:
+                self.entries[key] = (value, time.monotonic())
+        except Exception:
+            pass  # keep serving the stale value; the next read after the TTL tries again
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+class OllamaClient:
+    """One pooled, keep-alive HTTP session for every request the agent and the UI send to Ollama."""
+    def __init__(self, base_url=OLLAMA_URL, connect_timeout=2.0, read_timeout=300.0, retries=2, backoff=0.5, pool_size=8, cache_ttl=15.0, max_concurrency=None, keep_alive=None):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive  # how long Ollama keeps the model loaded after a request ("30m", "-1" = forever)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # a read timeout mid-generation is not worth paying for twice
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache = TTLCache(cache_ttl)
+        # Caps in-flight generations so a batch saturates the model server without queueing inside it
+        self.limiter = FairScheduler(max_concurrency) if max_concurrency else None
+        self.warming = {}  # (model, keep_alive) -> when its last warm-up started
+        self.warm_lock = threading.Lock()
+
+    def set_limiter(self, limiter):
+        """A FairScheduler, or any semaphore (e.g. a multiprocessing one shared across processes)."""
+        self.limiter = limiter
+
+    def _url(self, path):
+        return f"{self.base_url}{path}"
+
+    def generate(self, payload, stream=False, timeout=None, session=None, cancel_event=None):
+        """POSTs to /api/generate. With stream=True the caller owns (and must close) the response.
+
+        With a limiter, a streamed response keeps its slot until it is closed. `session` is the
+        queue a FairScheduler puts the request in; `cancel_event` gives up waiting for a slot.
+        """
+        payload = dict(payload, stream=stream)
+        if self.keep_alive is not None:
+            payload.setdefault("keep_alive", self.keep_alive)
+        release = self._acquire_slot(session, cancel_event)
+        try:
+            response = self.session.post(
+                self._url("/api/generate"),
+                json=payload,
+                stream=stream,
+                timeout=(self.connect_timeout, timeout or self.read_timeout),
+            )
+            response.raise_for_status()
+        except BaseException:
+            release()
+            raise
+        if not stream:
+            release()
+            return response
+        close = response.close
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+        response.close = close_and_release
+        return response
+
+    def _acquire_slot(self, session=None, cancel_event=None):
+        limiter = self.limiter
+        if limiter is None:
+            return lambda: None
+        if isinstance(limiter, FairScheduler):
+            limiter.acquire(session, cancel_event)
+        else:
+            limiter.acquire()
+        released = []
+        def release():
+            if not released:
+                released.append(True)
+                limiter.release()
+        return release
+
+    def warm_up(self, model, keep_alive=None, every=60.0):
+        """Loads `model` into memory on a background thread (an empty prompt only loads it).
+
+        Streamlit calls this on every rerun, so it is a no-op if the model was warmed in the last `every` seconds.
+        """
+        keep_alive = keep_alive if keep_alive is not None else self.keep_alive
+        # A new keep_alive is a different request: it changes how long Ollama holds the model
+        key = (model, keep_alive)
+        with self.warm_lock:
+            last = self.warming.get(key)
+            if last is not None and time.monotonic() - last < every:
+                return False
+            self.warming[key] = time.monotonic()
+
+        payload = {"model": model, "prompt": "", "stream": False}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+
+        def load():
+            try:
+                # Not behind the limiter: it is short, and blocking it behind a long generation defeats the point
+                self.session.post(self._url("/api/generate"), json=payload, timeout=(self.connect_timeout, self.read_timeout))
+            except requests.RequestException:
+                with self.warm_lock:
+                    self.warming.pop(key, None)
+        threading.Thread(target=load, daemon=True).start()
+        return True
+
+    def _probe_status(self):
+        try:
+            return self.session.get(self._url("/"), timeout=(self.connect_timeout, 2)).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def _probe_models(self):
+        response = self.session.get(self._url("/api/tags"), timeout=(self.connect_timeout, 5))
+        response.raise_for_status()
+        return [model["name"] for model in response.json().get("models", [])]
+
+    def is_online(self):
+        return self.cache.get("status", self._probe_status)
+
+    def list_models(self, default=("gemma",)):
+        try:
+            models = self.cache.get("models", self._probe_models)
+        except Exception:
+            return list(default)
+        return models or list(default)
+
+    def queue_position(self, session):
+        """1-based place of `session` in line for a generation slot, or 0 if it isn't waiting."""
+        return self.limiter.position(session) if isinstance(self.limiter, FairScheduler) else 0
+
+    def refresh(self):
+        """Drops the cached status/model list so the next call probes the server again."""
+        self.cache.invalidate()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def client_from_env(base_url=None):
+    """A client configured from the OLLAMA_* environment variables."""
+    return OllamaClient(
+        base_url=base_url or os.environ.get("OLLAMA_HOST", OLLAMA_URL),
+        connect_timeout=float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", 2)),
+        read_timeout=float(os.environ.get("OLLAMA_READ_TIMEOUT", 300)),
+        retries=int(os.environ.get("OLLAMA_RETRIES", 2)),
+        cache_ttl=float(os.environ.get("OLLAMA_STATUS_TTL", 15)),
+        max_concurrency=int(os.environ.get("OLLAMA_MAX_CONCURRENCY", 0)) or None,
+        keep_alive=os.environ.get("OLLAMA_KEEP_ALIVE") or None,
+    )
+
+def get_client():
+    """The process-wide client. Streamlit reruns and every PlanNode share its connection pool."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = client_from_env()
+        return _client
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+PLAN_CACHE_DIR = os.path.join(".pocketflow_cache", "plans")
+DEFAULT_MEMORY_ITEMS = 256
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+DISK_SUMMARY_TTL = 30  # seconds; other processes (batch workers) share the directory
+
+
+def normalize_goal(goal):
+    """'  Scaffold a Flask app. ' and 'scaffold a flask app' are the same request."""
+    return re.sub(r"\s+", " ", str(goal or "")).strip().rstrip(".!?").lower()
+
+
+def plan_key(goal, model, template_version, error_feedback=None, context=None):
+    """Everything that changes what the model would plan. `context` covers the replanning extras
+    (completed steps, file reads) that end up in the prompt next to the error."""
+    parts = [normalize_goal(goal), str(model), str(template_version), str(error_feedback or ""), json.dumps(context, sort_keys=True, default=str) if context else ""]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """Healed task lists by plan_key: an in-memory LRU in front of one JSON file per plan on disk.
+
+    The disk store is trimmed to `max_bytes`, dropping the least recently used files first
+    (every hit touches its file's mtime).
+    """
+    def __init__(self, path=PLAN_CACHE_DIR, memory_items=DEFAULT_MEMORY_ITEMS, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._disk = None  # (checked_at, entries, bytes), so summary() doesn't stat every file each call
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".json")
+
+    def _remember(self, key, tasks):
+        self.memory[key] = tasks
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """Returns the cached task list, or None."""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return [dict(t) for t in self.memory[key]]
+        try:
+            with open(self._file(key)) as f:
+                tasks = json.load(f)["tasks"]
+            os.utime(self._file(key))
+        except (OSError, ValueError, KeyError):
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        with self.lock:
+            self._remember(key, tasks)
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+        return [dict(t) for t in tasks]
+
+    def put(self, key, tasks, **meta):
+        if not tasks:
+            return
+        tasks = [dict(t) for t in tasks]
+        with self.lock:
+            self._remember(key, tasks)
+            self.stats["stores"] += 1
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"tasks": tasks, "stored": time.time(), **meta}, f)
+            os.replace(tmp, self._file(key))
+        except OSError:
+            return  # the in-memory copy still works
+        self._evict()
+
+    def invalidate(self, key):
+        """Forgets a plan that turned out not to work."""
+        with self.lock:
+            self.memory.pop(key, None)
+            self.stats["invalidations"] += 1
+            self._disk = None
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self._disk = None
+        for name in self._files():
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def _files(self):
+        try:
+            return [name for name in os.listdir(self.path) if name.endswith(".json")]
+        except OSError:
+            return []
+
+    def _evict(self):
+        entries = []
+        for name in self._files():
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                continue
+            total -= size
+            count -= 1
+            with self.lock:
+                self.memory.pop(name[:-len(".json")], None)
+                self.stats["evictions"] += 1
+        with self.lock:
+            self._disk = (time.time(), count, total)
+
+    def disk_usage(self):
+        total = 0
+        for name in self._files():
+            try:
+                total += os.path.getsize(os.path.join(self.path, name))
+            except OSError:
+                pass
+        return total
+
+    def summary(self):
+        """Counters for this process, plus the disk totals (refreshed on writes or every DISK_SUMMARY_TTL)."""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self.memory)
+            disk = self._disk
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        if disk is None or time.time() - disk[0] > DISK_SUMMARY_TTL:
+            disk = (time.time(), len(self._files()), self.disk_usage())
+            with self.lock:
+                self._disk = disk
+        stats["disk_entries"], stats["disk_bytes"] = disk[1], disk[2]
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_plan_cache():
+    """The process-wide plan cache, sized by POCKETFLOW_PLAN_CACHE_MB."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = float(os.environ.get("POCKETFLOW_PLAN_CACHE_MB", DEFAULT_MAX_BYTES / (1024 * 1024)))
+            _cache = PlanCache(max_bytes=int(max_mb * 1024 * 1024))
+        return _cache
@@ -0,0 +1,216 @@
+import os
+import re
+from healer import ALLOWED_ACTIONS
+from task_graph import workspace_relpath
+
+# Names models reach for instead of the five real actions
+ACTION_ALIASES = {
+    "create_dir": "mkdir", "make_dir": "mkdir", "mkdirs": "mkdir", "create_folder": "mkdir",
+    "write": "write_file", "create_file": "write_file", "save_file": "write_file", "edit_file": "write_file",
+    "read": "read_file", "cat": "read_file", "open_file": "read_file",
+    "run": "run_cmd", "exec": "run_cmd", "shell": "run_cmd", "bash": "run_cmd", "command": "run_cmd", "execute": "run_cmd",
+    "cp": "copy", "copy_file": "copy",
+}
+# Hallucinated field names, per canonical field (the healer already maps path/file/args to target)
+FIELD_ALIASES = {
+    "target": ("path", "file", "filename", "dest", "destination", "to", "command", "cmd"),
+    "source": ("src", "from", "source_path"),
+    "content": ("contents", "code", "text", "data", "body"),
+}
+# Files that are legitimately written empty
+EMPTY_FILES = ("__init__.py", ".gitkeep", ".keep", "py.typed")
+
+# The script an interpreter is asked to run: `python app/main.py`, `bash run.sh`, `./run.sh`
+_SCRIPT_ARG = re.compile(r"(?:^|&&|;|\|\|)\s*(?:(?:python3?|bash|sh|node|ruby|perl)\s+(?!-)([^\s;&|]+)|\./([^\s;&|]+))")
+
+
+def repair_task(task):
+    """Fixes what can be fixed without asking the model. Returns (task, list of fixes made)."""
+    if not isinstance(task, dict):
+        return task, []
+    task = dict(task)
+    fixes = []
+
+    action = str(task.get("action", "")).strip().lower()
+    action = ACTION_ALIASES.get(action, action)
+    if action != task.get("action"):
+        fixes.append(f"action '{task.get('action')}' -> '{action}'")
+        task["action"] = action
+
+    # normalize_task turns {"args": ["python", "x.py"]} into target "python"; a command needs all of it
+    args = task.get("args")
+    if action == "run_cmd" and isinstance(args, list) and len(args) > 1 and task.get("target") == args[0]:
+        task["target"] = " ".join(str(a) for a in args)
+        fixes.append("joined run_cmd args")
+
+    for field, aliases in FIELD_ALIASES.items():
+        if task.get(field) not in (None, ""):
+            continue
+        for alias in aliases:
+            if task.get(alias) not in (None, "") and not (field == "target" and alias in ("command", "cmd") and action != "run_cmd"):
+                task[field] = task[alias]
+                fixes.append(f"'{alias}' -> '{field}'")
+                break
+    return task, fixes
+
+
+def check_task(task, resolve):
+    """Problems that would make this task fail no matter what runs before it. Returns a list of strings.
+
+    `resolve` maps a task path into the workspace, or returns None if it lands outside of it.
+    """
+    if not isinstance(task, dict):
+        return []
+    action = task.get("action")
+    if action not in ALLOWED_ACTIONS:
+        return [f"unknown action '{action}' (allowed: {', '.join(ALLOWED_ACTIONS)})"]
+    target = task.get("target")
+    if not target or not isinstance(target, str):
+        return ["missing 'target'"]
+
+    problems = []
+    if action != "run_cmd" and resolve(target) is None:
+        problems.append(f"'{target}' is outside the workspace")
+    if action == "copy":
+        source = task.get("source")
+        if not source:
+            problems.append("'copy' needs a 'source'")
+        elif resolve(source) is None:
+            problems.append(f"source '{source}' is outside the workspace")
+    if action == "write_file" and "content" not in task and os.path.basename(target) not in EMPTY_FILES:
+        problems.append("'write_file' has no 'content'")
+    return problems
+
+
+def task_reads(task):
+    """Workspace files a task needs to exist before it runs."""
+    action = task.get("action")
+    if action == "copy" and task.get("source"):
+        return [workspace_relpath(task["source"])]
+    if action == "read_file":
+        return [workspace_relpath(task.get("target"))]
+    if action == "run_cmd":
+        cmd = str(task.get("target") or "")
+        if re.search(r"(?:^|[;&|]\s*)cd\s", cmd):
+            return []  # relative to some other directory, can't tell statically
+        return [workspace_relpath(a.strip("'\"")) for m in _SCRIPT_ARG.finditer(cmd) for a in m.groups() if a]
+    return []
+
+
+def task_writes(task):
+    action = task.get("action")
+    if action in ("mkdir", "write_file", "copy") and task.get("target"):
+        return [workspace_relpath(task["target"])]
+    return []
+
+
+def task_outputs(task):
+    """Paths a later step can read: a mkdir makes a folder, not the files someone expects in it."""
+    if task.get("action") in ("write_file", "copy") and task.get("target"):
+        return [workspace_relpath(task["target"])]
+    return []
+
+
+def _provides(written, path):
+    # A copied folder provides the files inside it
+    return any(path == w or path.startswith(w + "/") for w in written)
+
+
+def would_have_failed(repair):
+    """True for a repair without which ExecuteNode would have failed the step and asked for a replan.
+
+    An unknown action, a command cut down to its first word, a copy with no source and a step run
+    before its input exists all fail; a renamed target or content field does not.
+    """
+    fix = repair.split(": ", 1)[1] if repair.startswith("task ") else repair
+    return fix.startswith(("action '", "joined run_cmd args", "moved ")) or fix.endswith("-> 'source'")
+
+
+def validate_plan(tasks, resolve, complete=True):
+    """Repairs `tasks` and checks them before anything runs.
+
+    Returns (tasks, repairs, errors): the repaired list, one line per fix and one line per problem
+    left for the model. `complete=False` (a plan that is still streaming in) skips the checks that
+    need the whole plan: reordering and files that nothing creates.
+    """
+    repairs, errors = [], []
+    fixed = []
+    for i, task in enumerate(tasks):
+        task, fixes = repair_task(task)
+        repairs += [f"task {i + 1}: {fix}" for fix in fixes]
+        fixed.append(task)
+    tasks = fixed
+
+    if complete:
+        tasks = _reorder(tasks, resolve, repairs)
+
+    for i, task in enumerate(tasks):
+        if isinstance(task, dict):
+            errors += [f"{_label(i, task)}: {problem}" for problem in check_task(task, resolve)]
+    if complete:
+        errors += [f"{_label(i, tasks[i])}: needs '{path}', which doesn't exist and no step creates it" for i, path in missing_inputs(tasks, resolve)]
+    return tasks, repairs, errors
+
+
+def _label(i, task):
+    return f"task {i + 1} ({task.get('action')} `{task.get('target')}`)"
+
+
+def missing_inputs(tasks, resolve):
+    """(index, path) for every file a task reads that isn't on disk and no earlier step creates."""
+    missing, written = [], []
+    for i, task in enumerate(tasks):
+        if not isinstance(task, dict):
+            continue
+        for path in task_reads(task):
+            local = resolve(path)
+            if _provides(written, path) or (local and os.path.exists(local)):
+                continue
+            # An earlier command may well generate it (git clone, a build step...)
+            if any(path in str(t.get("target")) for t in tasks[:i] if isinstance(t, dict) and t.get("action") == "run_cmd"):
+                continue
+            missing.append((i, path))
+        written += task_outputs(task)
+    return missing
+
+
+def _reorder(tasks, resolve, repairs):
+    """Moves a write_file up in front of the first step that needs its file."""
+    tasks = list(tasks)
+    for _ in range(len(tasks)):
+        moved = False
+        for i, task in enumerate(tasks):
+            if not isinstance(task, dict):
+                continue
+            earlier = [w for t in tasks[:i] if isinstance(t, dict) for w in task_outputs(t)]
+            for path in task_reads(task):
+                local = resolve(path)
+                if _provides(earlier, path) or (local and os.path.exists(local)):
+                    continue
+                j = _producer(tasks, i, path)
+                if j is None:
+                    continue
+                producer = tasks.pop(j)
+                tasks.insert(i, producer)
+                repairs.append(f"moved {producer['action']} `{producer['target']}` before {task['action']} `{task['target']}`")
+                moved = True
+                break
+            if moved:
+                break
+        if not moved:
+            break
+    return tasks
+
+
+def _producer(tasks, i, path):
+    """Index of a later write_file that creates `path` and can safely run earlier, or None."""
+    for j in range(i + 1, len(tasks)):
+        t = tasks[j]
+        if not isinstance(t, dict) or t.get("action") != "write_file" or not _provides(task_outputs(t), path):
+            continue
+        # Nothing in between may touch the same path, or moving it would change what they see
+        between = tasks[i:j]
+        if any(isinstance(b, dict) and any(p == w or p.startswith(w + "/") or w.startswith(p + "/") for p in task_reads(b) + task_writes(b) for w in task_writes(t)) for b in between[1:]):
+            return None
+        return j
+    return None
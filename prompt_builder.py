@@ -0,0 +1,71 @@
+DEFAULT_PROMPT_BUDGET = 3000  # tokens; leaves room for the plan inside a 4k context window
+CHARS_PER_TOKEN = 4           # rough, but close enough for code and English on llama-style tokenizers
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def head_tail(text, max_tokens, head_share=0.4):
+    """Keeps the start and the end of `text` (where tracebacks put the useful bits) within `max_tokens`."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    marker = "\n[... {} chars omitted ...]\n"
+    room = max(0, max_chars - len(marker.format(len(text))))
+    head = int(room * head_share)
+    tail = room - head
+    omitted = len(text) - head - tail
+    return text[:head] + marker.format(omitted) + (text[-tail:] if tail else "")
+
+
+class PromptBuilder:
+    """Assembles a prompt from named sections and keeps it under a token budget.
+
+    Fixed sections (the instructions) are always sent whole. Whatever budget is left is shared
+    between the truncatable sections: small ones get everything they need, and the rest split
+    the remainder evenly and are cut down with `head_tail`.
+    """
+    def __init__(self, budget=DEFAULT_PROMPT_BUDGET):
+        self.budget = budget
+        self.sections = []
+
+    def add(self, name, text, truncatable=True):
+        if text:
+            self.sections.append({"name": name, "text": str(text), "truncatable": truncatable})
+        return self
+
+    def _allocate(self):
+        fixed = sum(estimate_tokens(s["text"]) for s in self.sections if not s["truncatable"])
+        remaining = max(0, self.budget - fixed)
+        flexible = sorted((i for i, s in enumerate(self.sections) if s["truncatable"]), key=lambda i: estimate_tokens(self.sections[i]["text"]))
+        allowance = {}
+        for n, i in enumerate(flexible):
+            share = remaining // (len(flexible) - n)
+            allowance[i] = min(estimate_tokens(self.sections[i]["text"]), share)
+            remaining -= allowance[i]
+        return allowance
+
+    def build(self, separator="\n\n"):
+        """Returns (prompt, report) where report lists the tokens each section used."""
+        allowance = self._allocate()
+        parts, report = [], []
+        for i, section in enumerate(self.sections):
+            text = section["text"]
+            original = estimate_tokens(text)
+            if section["truncatable"]:
+                text = head_tail(text, allowance[i])
+            parts.append(text)
+            report.append({
+                "section": section["name"],
+                "tokens": estimate_tokens(text),
+                "original_tokens": original,
+                "truncated": len(text) != len(section["text"]),
+            })
+        return separator.join(parts), report
+
+
+def format_report(report, budget):
+    total = sum(r["tokens"] for r in report)
+    parts = [f"{r['section']} {r['tokens']}" + (f" (cut from {r['original_tokens']})" if r["truncated"] else "") for r in report]
+    return f"🧮 Prompt: ~{total}/{budget} tokens: " + ", ".join(parts)
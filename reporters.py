@@ -0,0 +1,140 @@
+import sys
+import json
+import time
+import itertools
+
+LIVE_OUTPUT_LINES = 40  # how much of a running command's output stays on screen
+
+
+class _NullStatus:
+    def write(self, text): pass
+    def caption(self, text): pass
+    def update(self, **kwargs): pass
+
+
+class Reporter:
+    """How the nodes talk to whoever is watching. The base class ignores everything (headless runs).
+
+    `message` is part of the conversation and is kept in the chat history; `notice` is transient
+    progress. Levels are "info", "caption", "warning", "error" and "success".
+    """
+    def message(self, text, level="info"): pass
+
+    def notice(self, text, level="info"): pass
+
+    def status(self, label):
+        """A collapsible progress block with write / caption / update(label=..., state=...)."""
+        return _NullStatus()
+
+    def live_command(self, command):
+        """Returns an object with line / idle / finish(result) for a running command, or None."""
+        return None
+
+    def approve(self, command, trace=None, approvals=None, pending=()):
+        """True if `command` may run. Headless runs have nobody to ask, so they just go ahead.
+
+        `approvals` is the run's ApprovalPolicy and `pending` the plan's commands still to come,
+        for an "approve them all" answer.
+        """
+        return True
+
+    def celebrate(self): pass
+
+
+class ConsoleReporter(Reporter):
+    """Plain text on a terminal, for main.py and batch workers."""
+    def __init__(self, stream=None, show_output=True, ask_approval=False):
+        self.stream = stream or sys.stdout
+        self.show_output = show_output
+        self.ask_approval = ask_approval
+
+    def _print(self, text):
+        print(text, file=self.stream, flush=True)
+
+    def message(self, text, level="info"):
+        self._print(text)
+
+    def notice(self, text, level="info"):
+        self._print(text)
+
+    def status(self, label):
+        self._print(label)
+        reporter = self
+
+        class _Status:
+            def write(self, text): reporter._print(f"  {text}")
+            def caption(self, text): reporter._print(f"  {text}")
+            def update(self, label=None, **kwargs):
+                if label: reporter._print(f"  {label}")
+        return _Status()
+
+    def live_command(self, command):
+        if not self.show_output:
+            return None
+        self._print(f"🖥️ Running `{command}`...")
+        reporter = self
+
+        class _Live:
+            def line(self, text): reporter._print(f"  | {text.rstrip()}")
+            def idle(self): pass
+            def finish(self, res): reporter._print(f"  {'✅' if res.ok else '❌'} finished in {res.duration:.1f}s")
+        return _Live()
+
+    def approve(self, command, trace=None, approvals=None, pending=()):
+        if not self.ask_approval or (approvals and approvals.is_approved(command)):
+            return True
+        started = time.time()
+        others = f", a = all {len(pending)} commands in this plan" if approvals and len(pending) > 1 else ""
+        answer = input(f"⚠️ Approval Required: Run `{command}`? [y/N{'/a' if others else ''}{others}] ").strip().lower()
+        if trace: trace.record("approval", command=command, seconds=round(time.time() - started, 3))
+        if approvals and others and answer in ("a", "all"):
+            approvals.approve(command, *pending)
+            return True
+        if approvals and answer in ("y", "yes"):
+            approvals.approve(command)
+        return answer in ("y", "yes")
+
+
+class JsonReporter(Reporter):
+    """One JSON object per line, for tools that consume the run programmatically."""
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.status_ids = itertools.count(1)
+
+    def emit(self, event, **fields):
+        self.stream.write(json.dumps({"event": event, "time": round(time.time(), 3), **fields}, default=str) + "\n")
+        self.stream.flush()
+
+    def message(self, text, level="info"):
+        self.emit("message", level=level, text=text)
+
+    def notice(self, text, level="info"):
+        self.emit("notice", level=level, text=text)
+
+    def status(self, label):
+        reporter = self
+        status_id = next(self.status_ids)
+        self.emit("status", id=status_id, label=label)
+
+        class _Status:
+            def write(self, text): reporter.emit("status", id=status_id, label=label, text=text)
+            def caption(self, text): reporter.emit("status", id=status_id, label=label, text=text)
+            def update(self, **kwargs): reporter.emit("status", **{"id": status_id, "label": label, **kwargs})
+        return _Status()
+
+    def live_command(self, command):
+        reporter = self
+        self.emit("command_start", command=command)
+
+        class _Live:
+            def line(self, text): reporter.emit("output", command=command, line=text.rstrip("\n"))
+            def idle(self): pass
+            def finish(self, res): reporter.emit("command_end", command=command, returncode=res.returncode, seconds=round(res.duration, 3), timed_out=res.timed_out)
+        return _Live()
+
+
+NULL_REPORTER = Reporter()
+
+
+def get_reporter(shared):
+    return (shared.get("reporter") if shared else None) or NULL_REPORTER
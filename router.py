@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import queue
+import threading
+import requests
+from ollama_client import client_from_env, get_client
+
+EWMA_WEIGHT = 0.3  # how much the latest generation moves an endpoint's latency estimate
+MAX_COOLDOWN = 30.0  # longest an endpoint is skipped after failing in a row
+
+
+class Endpoint:
+    """One Ollama server behind the router, with what the router knows about its health and load."""
+    def __init__(self, client):
+        self.client = client
+        self.url = client.base_url
+        self.in_flight = 0
+        self.latency = None  # EWMA of successful generations, seconds
+        self.failures = 0  # in a row
+        self.down_until = 0.0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def healthy(self, now=None):
+        return (now or time.monotonic()) >= self.down_until
+
+    def has_model(self, model):
+        """False only if the server is known to lack `model` (its list is cached by the client)."""
+        if not self.healthy():
+            return True  # don't block on probing a server that is down anyway
+        models = self.client.list_models(default=())
+        return not model or not models or _tagged(model) in {_tagged(m) for m in models}
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+            self.calls += 1
+
+    def finished(self, seconds=None, error=None):
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if error is not None:
+                self.failures += 1
+                self.down_until = time.monotonic() + min(MAX_COOLDOWN, 2 ** (self.failures - 1))
+            else:
+                self.failures = 0
+                self.down_until = 0.0
+                if seconds is not None:
+                    self.latency = seconds if self.latency is None else (1 - EWMA_WEIGHT) * self.latency + EWMA_WEIGHT * seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {"url": self.url, "healthy": self.healthy(), "in_flight": self.in_flight, "calls": self.calls,
+                    "latency": round(self.latency, 3) if self.latency is not None else None, "failures": self.failures}
+
+
+def _is_server_error(error):
+    # A bad request is our fault, not the server's, and says nothing about its health
+    return isinstance(error, (requests.ConnectionError, requests.Timeout)) or (
+        isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code >= 500)
+
+
+def _is_missing_model(error):
+    # Ollama answers 404 for a model it hasn't pulled: another server may well have it
+    return isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code == 404
+
+
+def _tagged(model):
+    return model if ":" in model else model + ":latest"
+
+
+def _abandon(attempt):
+    """Stops an attempt. Closing its connection makes Ollama stop generating for it."""
+    attempt["stop"].set()
+    response = attempt["response"]
+    if response is not None:
+        try:
+            response.close()
+        except Exception:
+            pass
+
+
+class ModelRouter:
+    """Spreads generations over several Ollama servers.
+
+    Each request goes to the least-loaded healthy endpoint (fewest in flight, then fastest
+    recently). An endpoint that fails is skipped for a while, longer each time it fails again, and
+    a failed request moves on to the next endpoint. `plan()` can also hedge: if the first answer is
+    slow, the same prompt goes to a second endpoint (or a smaller model) and whichever valid plan
+    arrives first wins; the other request is dropped mid-generation.
+    """
+    def __init__(self, clients):
+        self.endpoints = [Endpoint(c) for c in clients]
+        self.lock = threading.Lock()
+        self.hedges = {"fired": 0, "won": 0}
+
+    def pick(self, exclude=(), model=None):
+        """The least-loaded healthy endpoint that has `model`, or the one that comes back soonest if all are down."""
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e not in exclude] or list(self.endpoints)
+        candidates = [e for e in candidates if e.has_model(model)] or candidates
+        healthy = [e for e in candidates if e.healthy(now)]
+        if not healthy:
+            return min(candidates, key=lambda e: e.down_until)
+        return min(healthy, key=lambda e: (e.in_flight, e.latency if e.latency is not None else 0.0))
+
+    def stream(self, payload, timeout=None, session=None, cancel_event=None):
+        """A streamed generation on the least-loaded endpoint; the caller closes the response as usual."""
+        tried = []
+        while True:
+            endpoint = self.pick(exclude=tried, model=payload.get("model"))
+            tried.append(endpoint)
+            endpoint.started()
+            try:
+                response = endpoint.client.generate(payload, stream=True, timeout=timeout, session=session, cancel_event=cancel_event)
+            except Exception as e:
+                endpoint.finished(error=e if _is_server_error(e) else None)
+                if _is_missing_model(e):
+                    endpoint.client.refresh()  # its model list is out of date
+                if not (_is_server_error(e) or _is_missing_model(e)) or len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            started = time.perf_counter()
+            close = response.close
+            def close_and_finish(close=close, endpoint=endpoint, started=started):
+                close()
+                if not getattr(response, "_router_done", False):
+                    response._router_done = True
+                    endpoint.finished(time.perf_counter() - started)
+            response.close = close_and_finish
+            response.endpoint = endpoint.url
+            return response
+
+    def plan(self, payload, accept=None, hedge_after=None, hedge_model=None, timeout=None, session=None, cancel_event=None):
+        """A non-streamed generation, returned as Ollama's final message dict plus "endpoint" and "hedged".
+
+        `accept(text)` parses a response and returns the result, or something falsy if it isn't
+        usable (e.g. doesn't heal into a non-empty plan); the winner's comes back as "parsed", so
+        the caller doesn't parse it again. An unusable or failed answer makes the router try the
+        next endpoint instead of waiting. With `hedge_after` seconds, a second request starts if
+        nothing usable arrived by then.
+        """
+        results = queue.Queue()
+        attempts = []  # {"stop": Event, "response": the open HTTP response, once there is one}
+        launched = []  # (endpoint, model) already asked
+
+        def launch(endpoint, body, hedge=False):
+            attempt = {"stop": threading.Event(), "response": None}
+            attempts.append(attempt)
+            launched.append((endpoint, body.get("model")))
+            if hedge:
+                with self.lock:
+                    self.hedges["fired"] += 1
+            threading.Thread(target=self._attempt, args=(endpoint, body, attempt, results, hedge, timeout, session), daemon=True).start()
+
+        def next_target(hedge):
+            """Another endpoint not asked yet; for a hedge, else the first one with the smaller model."""
+            model = (hedge_model or payload.get("model")) if hedge else payload.get("model")
+            if payload.get("context") and model != payload.get("model"):
+                model = payload.get("model")  # a carried context only makes sense to the model that produced it
+            asked = [e for e, _ in launched]
+            if any(e not in asked and e.healthy() and e.has_model(model) for e in self.endpoints):
+                return self.pick(exclude=asked, model=model), dict(payload, model=model)
+            if hedge and (launched[0][0], model) not in launched:
+                return launched[0][0], dict(payload, model=model)
+            return None
+
+        launch(self.pick(model=payload.get("model")), payload)
+        hedge_at = time.monotonic() + hedge_after if hedge_after is not None else None
+        hedging = False  # past the deadline: keep a backup going until something usable arrives
+        pending, last_result, last_error = 1, None, None
+        try:
+            while pending:
+                try:
+                    hedge, result, error = results.get(timeout=0.05)
+                except queue.Empty:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RuntimeError("Cancelled while waiting for the model")
+                    if hedge_at is not None and time.monotonic() >= hedge_at:
+                        hedge_at, hedging = None, True
+                        target = next_target(hedge=True)
+                        if target:
+                            launch(*target, hedge=True)
+                            pending += 1
+                    continue
+                pending -= 1
+                parsed = accept(result.get("response", "")) if error is None and accept is not None else None
+                if error is None and (accept is None or parsed):
+                    result["parsed"] = parsed
+                    result["hedged"] = hedge
+                    if hedge:
+                        with self.lock:
+                            self.hedges["won"] += 1
+                    return result
+                if error is None:
+                    last_result = result
+                else:
+                    last_error = error
+                # Nothing usable from this one: rather than wait, ask the next endpoint if nothing else
+                # is running, or if the hedge deadline has passed anyway
+                if (not pending or hedging) and (error is None or _is_server_error(error) or _is_missing_model(error)):
+                    target = next_target(hedge=hedging)
+                    if target:
+                        launch(*target, hedge=hedging)
+                        pending += 1
+        finally:
+            for attempt in attempts:
+                _abandon(attempt)
+        if last_result is not None:
+            return dict(last_result, hedged=False)
+        raise last_error
+
+    def _attempt(self, endpoint, body, attempt, results, hedge, timeout, session):
+        """Runs one generation, streamed so that it can be abandoned at any point."""
+        stop = attempt["stop"]
+        endpoint.started()
+        started = time.perf_counter()
+        text, final, error = [], {}, None
+        try:
+            response = attempt["response"] = endpoint.client.generate(body, stream=True, timeout=timeout, session=session, cancel_event=stop)
+            if stop.is_set():
+                response.close()
+                return
+            try:
+                for line in response.iter_lines():
+                    if stop.is_set():
+                        return
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    text.append(message.get("response", ""))
+                    if message.get("done"):
+                        final = message
+                        break
+            finally:
+                response.close()
+        except Exception as e:
+            error = e
+            if _is_missing_model(e):
+                endpoint.client.refresh()  # its model list is out of date
+        finally:
+            seconds = time.perf_counter() - started
+            if stop.is_set() and error is None and not final:
+                endpoint.finished()  # cancelled: neither a failure nor a latency sample
+            else:
+                endpoint.finished(seconds if error is None else None, error=error if error is not None and _is_server_error(error) else None)
+        if stop.is_set():
+            return
+        result = dict(final, response="".join(text), endpoint=endpoint.url, model=body.get("model"), seconds=round(seconds, 4))
+        results.put((hedge, None if error else result, error))
+
+    def is_online(self):
+        return any(e.client.is_online() for e in self.endpoints)
+
+    def list_models(self, default=("gemma",)):
+        """Every model some online endpoint has, first endpoint's first."""
+        models = []
+        for e in self.endpoints:
+            if e.client.is_online():
+                models += [m for m in e.client.list_models(default=()) if m not in models]
+        return models or list(default)
+
+    def warm_up(self, model, keep_alive=None):
+        return any([e.client.warm_up(model, keep_alive) for e in self.endpoints])
+
+    def refresh(self):
+        for e in self.endpoints:
+            e.client.refresh()
+
+    def clients(self):
+        return [e.client for e in self.endpoints]
+
+    def queue_position(self, session):
+        positions = [p for p in (c.queue_position(session) for c in self.clients()) if p]
+        return min(positions) if positions else 0
+
+    def snapshot(self):
+        with self.lock:
+            hedges = dict(self.hedges)
+        return {"endpoints": [e.snapshot() for e in self.endpoints], "hedges": hedges}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """The process-wide router over OLLAMA_HOSTS (comma-separated), or just the OLLAMA_HOST client."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            urls = [u.strip().rstrip("/") for u in os.environ.get("OLLAMA_HOSTS", "").split(",") if u.strip()]
+            primary = get_client()
+            _router = ModelRouter([primary] + [client_from_env(u) for u in urls if u != primary.base_url])
+        return _router
+
+def set_router(router):
+    global _router
+    with _router_lock:
+        _router = router
@@ -0,0 +1,257 @@
+import os
+import time
+import queue
+import shlex
+import shutil
+import signal
+import tempfile
+import threading
+import uuid
+import subprocess
+from collections import deque
+
+DEFAULT_CMD_TIMEOUT = 600   # seconds; long installs and builds need more than the old 30s
+MAX_OUTPUT_LINES = 200      # only the head and tail of the output are kept in memory
+HEAD_LINES = 40             # ...of which this many are the first lines (commands often fail early)
+MAX_LINE_CHARS = 2000
+
+
+class CommandResult:
+    def __init__(self, returncode, head, lines, dropped, duration, timed_out=False, cancelled=False):
+        self.returncode = returncode
+        self.head = head
+        self.lines = lines
+        self.dropped = dropped
+        self.duration = duration
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    @property
+    def output(self):
+        middle = f"[... {self.dropped} lines dropped ...]\n" if self.dropped else ""
+        return "".join(self.head) + middle + "".join(self.lines)
+
+    def describe(self, timeout=None):
+        """The result text ExecuteNode reports and feeds back to the planner."""
+        if self.cancelled:
+            return f"❌ Error: Command cancelled by user after {self.duration:.1f}s.\n{self.output}".rstrip()
+        if self.timed_out:
+            return f"❌ Error: Command timed out after {timeout}s.\n{self.output}".rstrip()
+        if self.returncode != 0:
+            return f"Error (exit code {self.returncode}): {self.output}"
+        return self.output
+
+
+def _pump(stream, lines):
+    for line in iter(stream.readline, ""):
+        lines.put(line)
+    stream.close()
+    lines.put(None)
+
+
+def _kill(proc):
+    if proc.poll() is not None:
+        return
+    try:
+        # The command runs in its own session, so this also takes down anything it spawned
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        proc.kill()
+    proc.wait()
+
+
+class _Output:
+    """Keeps the head and tail of a command's output as it streams in."""
+    def __init__(self, on_line=None, max_lines=MAX_OUTPUT_LINES):
+        self.on_line = on_line
+        self.head_size = min(HEAD_LINES, max_lines // 2)
+        self.head, self.tail = [], deque(maxlen=max_lines - self.head_size)
+        self.seen = 0
+
+    def add(self, line):
+        if len(line) > MAX_LINE_CHARS:
+            line = line[:MAX_LINE_CHARS] + " [...line truncated]\n"
+        if len(self.head) < self.head_size:
+            self.head.append(line)
+        else:
+            self.tail.append(line)
+        self.seen += 1
+        if self.on_line:
+            self.on_line(line)
+
+    def result(self, returncode, duration, timed_out=False, cancelled=False):
+        return CommandResult(returncode, self.head, list(self.tail), self.seen - len(self.head) - len(self.tail), duration, timed_out, cancelled)
+
+
+def _drain(lines, out, start, timeout, cancel_event=None, on_idle=None, end=None):
+    """Feeds queued lines into `out` until the pump signals EOF (None) or `end(line)` says the command finished.
+
+    Returns (status, returncode) with status "eof", "done", "timeout" or "cancelled".
+    """
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            return "cancelled", None
+        if timeout and time.monotonic() - start > timeout:
+            return "timeout", None
+        try:
+            line = lines.get(timeout=0.1)
+        except queue.Empty:
+            if on_idle:
+                on_idle()
+            continue
+        if line is None:
+            return "eof", None
+        if end is not None:
+            finished = end(line)
+            if finished is not None:
+                rest, returncode = finished
+                if rest:
+                    out.add(rest + "\n")
+                return "done", returncode
+        out.add(line)
+
+
+def run_streaming(cmd, cwd, timeout=DEFAULT_CMD_TIMEOUT, on_line=None, on_idle=None, cancel_event=None, max_lines=MAX_OUTPUT_LINES):
+    """Runs a shell command, handing each output line to `on_line` as soon as it is printed.
+
+    stdout and stderr are merged so they stay in order. Only the first few and the last lines
+    (`max_lines` in total) are kept.
+    `on_idle` is polled while the command is quiet. If either callback raises (e.g. Streamlit
+    interrupting the script for a STOP click), the process is killed.
+    """
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        cmd,
+        shell=True,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        stdin=subprocess.DEVNULL,
+        text=True,
+        errors="replace",
+        bufsize=1,
+        start_new_session=(os.name == "posix"),
+    )
+    lines = queue.Queue()
+    threading.Thread(target=_pump, args=(proc.stdout, lines), daemon=True).start()
+
+    out = _Output(on_line, max_lines)
+    status = None
+    try:
+        status, _ = _drain(lines, out, start, timeout, cancel_event, on_idle)
+    finally:
+        if status != "eof":
+            _kill(proc)
+    timed_out, cancelled = status == "timeout", status == "cancelled"
+
+    try:
+        # Output is closed, but the process may still be shutting down
+        returncode = proc.wait(timeout=max(1.0, timeout - (time.monotonic() - start)) if timeout else None)
+    except subprocess.TimeoutExpired:
+        _kill(proc)
+        returncode, timed_out = proc.returncode, True
+    return out.result(returncode, time.monotonic() - start, timed_out, cancelled)
+
+
+class ShellSession:
+    """One long-lived bash per run, so `cd`, exported variables and an activated venv carry over
+    from one run_cmd to the next.
+
+    Every command is followed by a sentinel line carrying its exit code, which is how the end of
+    its output is found. If the working directory ends up outside the workspace it is moved back.
+    A timeout, a STOP click or an `exit` kills the whole shell; the next command starts a fresh one.
+    """
+    def __init__(self, workspace, shell=None):
+        self.workspace = os.path.realpath(workspace)
+        self.shell = shell or shutil.which("bash") or shutil.which("sh")
+        self.proc = None
+        self.lines = None
+        self.restarts = -1  # the first start isn't a restart
+        self.restarted = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return os.name == "posix" and bool(shutil.which("bash") or shutil.which("sh"))
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def _start(self):
+        self.proc = subprocess.Popen(
+            [self.shell],
+            cwd=self.workspace,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            bufsize=1,
+            start_new_session=True,
+        )
+        self.lines = queue.Queue()
+        threading.Thread(target=_pump, args=(self.proc.stdout, self.lines), daemon=True).start()
+        self.restarts += 1
+        self.restarted = self.restarts > 0
+
+    def run(self, cmd, timeout=DEFAULT_CMD_TIMEOUT, on_line=None, on_idle=None, cancel_event=None, max_lines=MAX_OUTPUT_LINES):
+        """Same contract as run_streaming, but in the session's shell."""
+        with self.lock:
+            if not self.alive:
+                self._start()
+            start = time.monotonic()
+            marker = f"__POCKETFLOW_DONE_{uuid.uuid4().hex}__"
+            ws = shlex.quote(self.workspace)
+            # The command goes in a file that is sourced, so it runs in this shell (a subshell would
+            # throw `cd` and `export` away) and a syntax error like an unterminated quote ends at the
+            # end of that file with status 2, instead of swallowing the sentinel lines below.
+            # </dev/null stops it from reading those lines as its input.
+            fd, cmd_file = tempfile.mkstemp(prefix="pocketflow_cmd_", suffix=".sh")
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{cmd}\n")
+            script = (
+                f". {shlex.quote(cmd_file)} </dev/null 2>&1\n"
+                "__pf_rc=$?\n"
+                f'case "$(pwd -P)/" in {ws}/*) ;; *) echo "⚠️ cwd was outside the workspace, moved back"; cd {ws} ;; esac\n'
+                f"printf '%s%s\\n' {marker} \"$__pf_rc\"\n"
+            )
+
+            def end(line):
+                at = line.find(marker)
+                if at < 0:
+                    return None
+                return line[:at], int(line[at + len(marker):].strip() or 1)
+
+            out = _Output(on_line, max_lines)
+            if self.restarted:
+                out.add("ℹ️ Started a new shell session: directory changes, variables and venvs from earlier commands are gone.\n")
+                self.restarted = False
+            status = None
+            try:
+                try:
+                    self.proc.stdin.write(script)
+                    self.proc.stdin.flush()
+                except (BrokenPipeError, OSError):
+                    status = "eof"
+                else:
+                    status, returncode = _drain(self.lines, out, start, timeout, cancel_event, on_idle, end)
+            finally:
+                if status not in ("done", "eof"):
+                    self.close()
+                os.unlink(cmd_file)
+            if status == "eof":
+                # The command ended the shell itself (`exit 3`); report its status and start over next time
+                returncode = self.proc.wait()
+                self.proc = None
+            timed_out, cancelled = status == "timeout", status == "cancelled"
+            return out.result(returncode if status in ("done", "eof") else -9, time.monotonic() - start, timed_out, cancelled)
+
+    def close(self):
+        if self.proc is not None:
+            _kill(self.proc)
+            self.proc = None
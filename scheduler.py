@@ -0,0 +1,88 @@
+import time
+import threading
+from collections import OrderedDict, deque
+
+WAIT_STATS_SESSIONS = 256  # sessions whose wait stats are kept; the least recently served are dropped
+
+
+class FairScheduler:
+    """Bounded in-flight Ollama requests shared by every session in the process.
+
+    Works as the client's limiter, like a semaphore, but waiting requests are served round-robin
+    by session: someone with ten queued generations can't starve someone with one.
+    Requests without a session share one anonymous queue.
+    """
+    def __init__(self, max_in_flight=2, stats_sessions=WAIT_STATS_SESSIONS):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.in_flight = 0
+        self.queues = OrderedDict()  # session -> deque of waiting tickets, in turn order
+        self.cond = threading.Condition()
+        self.waits = OrderedDict()  # session -> [count, total seconds, max seconds], least recently served first
+        self.stats_sessions = stats_sessions
+
+    def _is_next(self, session, ticket):
+        if self.in_flight >= self.max_in_flight or not self.queues:
+            return False
+        first_session, tickets = next(iter(self.queues.items()))
+        return first_session == session and tickets[0] is ticket
+
+    def acquire(self, session=None, cancel_event=None):
+        """Blocks until it is this session's turn. Raises RuntimeError if `cancel_event` is set meanwhile."""
+        ticket = object()
+        started = time.monotonic()
+        with self.cond:
+            self.queues.setdefault(session, deque()).append(ticket)
+            try:
+                while not self._is_next(session, ticket):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RuntimeError("Cancelled while waiting for the model")
+                    self.cond.wait(timeout=0.2 if cancel_event is not None else None)
+            except BaseException:
+                self._drop(session, ticket)
+                raise
+            tickets = self.queues.pop(session)
+            tickets.popleft()
+            if tickets:
+                self.queues[session] = tickets  # back of the line for its next request
+            self.in_flight += 1
+            waited = time.monotonic() - started
+            stats = self.waits.setdefault(session, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+            self.waits.move_to_end(session)
+            while len(self.waits) > self.stats_sessions:
+                self.waits.popitem(last=False)
+            self.cond.notify_all()
+        return True
+
+    def _drop(self, session, ticket):
+        tickets = self.queues.get(session)
+        if tickets is not None:
+            tickets.remove(ticket)
+            if not tickets:
+                del self.queues[session]
+        self.cond.notify_all()
+
+    def release(self):
+        with self.cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.cond.notify_all()
+
+    def position(self, session):
+        """Where `session`'s next request stands in line (1 = next up), or 0 if it isn't waiting."""
+        with self.cond:
+            for i, waiting in enumerate(self.queues):
+                if waiting == session:
+                    return i + 1
+        return 0
+
+    def snapshot(self):
+        with self.cond:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "waiting": sum(len(t) for t in self.queues.values()),
+                "sessions_waiting": len(self.queues),
+                "waits": {str(s): {"requests": n, "avg_seconds": round(total / n, 4) if n else 0.0, "max_seconds": round(worst, 4)} for s, (n, total, worst) in self.waits.items()},
+            }
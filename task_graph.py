@@ -0,0 +1,133 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# File operations that only touch the paths they name, so independent ones can overlap
+PARALLEL_ACTIONS = ("mkdir", "write_file", "read_file", "copy")
+
+_PATH_TOKEN = re.compile(r"[\w.\-/]+")
+
+
+def workspace_relpath(path):
+    """Normalizes a task path the way ExecuteNode sees it, minus the 'workspace/' prefix."""
+    path = os.path.normpath(str(path or "")).replace("\\", "/")
+    if path == "workspace":
+        return "."
+    return path[len("workspace/"):] if path.startswith("workspace/") else path
+
+
+def command_paths(cmd):
+    """Best-effort guess at the workspace files a shell command refers to (`python app/main.py` -> app/main.py)."""
+    paths = set()
+    for token in _PATH_TOKEN.findall(str(cmd or "")):
+        if token.startswith("-") or token in (".", ".."):
+            continue
+        if "/" in token or os.path.splitext(token)[1]:
+            paths.add(workspace_relpath(token))
+    return paths
+
+
+def task_paths(task):
+    """Returns (reads, writes): the workspace paths a task depends on and the ones it produces."""
+    action = task.get("action")
+    target = workspace_relpath(task.get("target") or task.get("path"))
+    if action in ("mkdir", "write_file"):
+        return set(), {target}
+    if action == "copy":
+        return {workspace_relpath(task.get("source"))}, {target}
+    if action == "read_file":
+        return {target}, set()
+    if action == "run_cmd":
+        return command_paths(task.get("target")), set()
+    return set(), set()
+
+
+def _overlaps(a, b):
+    """True if one path is the other or one of its parent directories."""
+    if a == b or a == "." or b == ".":
+        return True
+    return a.startswith(b + "/") or b.startswith(a + "/")
+
+
+def build_dag(tasks):
+    """Maps each task index to the earlier indexes it must wait for.
+
+    Two tasks conflict when one writes a path the other reads or writes, or a parent/child of it.
+    Conflicting tasks keep their plan order; everything else is free to run side by side.
+    """
+    footprints = [task_paths(t) for t in tasks]
+    deps = {}
+    for i, (reads_i, writes_i) in enumerate(footprints):
+        deps[i] = set()
+        for j in range(i):
+            reads_j, writes_j = footprints[j]
+            if any(_overlaps(w, p) for w in writes_j for p in reads_i | writes_i) or \
+               any(_overlaps(w, p) for w in writes_i for p in reads_j):
+                deps[i].add(j)
+    return deps
+
+
+def next_batch(tasks, start, limit=32):
+    """Longest run of file operations starting at `start` that can be scheduled together.
+
+    `run_cmd` (and anything that isn't a plain file task) is a barrier: it runs alone, after every
+    earlier task and before every later one, which also keeps the approval gate one command at a time.
+    """
+    end = start
+    while end < len(tasks) and end - start < limit:
+        task = tasks[end]
+        if not isinstance(task, dict) or task.get("action") not in PARALLEL_ACTIONS:
+            break
+        end += 1
+    return list(range(start, max(end, start + 1)))
+
+
+def run_batch(tasks, run_task, max_workers=4, is_failure=None, first_index=0):
+    """Runs independent tasks on a thread pool in dependency order.
+
+    Returns the results in plan order. A task whose dependency failed is not run at all.
+    """
+    deps = build_dag(tasks)
+    results = [None] * len(tasks)
+    done, failed = set(), set()
+    if max_workers <= 1 or len(tasks) <= 1:
+        for i, task in enumerate(tasks):
+            blocked_by = deps[i] & failed
+            results[i] = _blocked(blocked_by, first_index) if blocked_by else run_task(task)
+            if blocked_by or (is_failure and is_failure(results[i])):
+                failed.add(i)
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        pending = set(range(len(tasks)))
+        while pending or running:
+            for i in sorted(pending):
+                if not deps[i] <= done:
+                    continue
+                pending.discard(i)
+                blocked_by = sorted(deps[i] & failed)
+                if blocked_by:
+                    results[i] = _blocked(blocked_by, first_index)
+                    done.add(i)
+                    failed.add(i)
+                else:
+                    running[pool.submit(run_task, tasks[i])] = i
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = f"❌ Error: {e}"
+                done.add(i)
+                if is_failure and is_failure(results[i]):
+                    failed.add(i)
+    return results
+
+
+def _blocked(indexes, first_index):
+    steps = ", ".join(f"#{first_index + i + 1}" for i in sorted(indexes))
+    return f"⏸️ Not run: waits on a step that did not succeed ({steps})."
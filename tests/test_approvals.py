@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from approvals import ApprovalPolicy
+
+
+def test_allowlist_matches_a_simple_command():
+    assert ApprovalPolicy(["python *.py"]).matching_pattern("python  app.py") == "python *.py"
+
+
+def test_allowlist_refuses_chained_commands():
+    policy = ApprovalPolicy(["python *.py"])
+    assert policy.matching_pattern("python a.py; rm -rf ~/junk.py") is None
+    assert policy.matching_pattern("python a.py && rm -rf ~/junk.py") is None
+
+
+def test_allowlist_refuses_multi_line_commands():
+    # The shell runs every line, but whitespace normalization would make this look like one command
+    policy = ApprovalPolicy(["python *.py"])
+    assert policy.matching_pattern("python a.py\nrm -rf ~/junk.py") is None
+    assert policy.matching_pattern("python a.py\r\nrm -rf ~/junk.py") is None
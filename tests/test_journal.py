@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from journal import find_completed, record
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_copy_runs_again_when_its_source_changed(tmp_path):
+    ws = str(tmp_path)
+    _write(tmp_path / "a.txt", "v1")
+    copy = {"action": "copy", "source": "a.txt", "target": "b.txt"}
+    _write(tmp_path / "b.txt", "v1")
+    journal = []
+    record(journal, copy, "Copied", ws)
+    assert find_completed(journal, copy, ws) is not None
+    _write(tmp_path / "a.txt", "v2")
+    assert find_completed(journal, copy, ws) is None
+
+
+def test_write_file_runs_again_when_the_file_was_edited(tmp_path):
+    ws = str(tmp_path)
+    task = {"action": "write_file", "target": "app.py", "content": "print(1)"}
+    _write(tmp_path / "app.py", "print(1)")
+    journal = []
+    record(journal, task, "Written", ws)
+    assert find_completed(journal, task, ws) is not None
+    _write(tmp_path / "app.py", "print(2)")  # e.g. a later run_cmd rewrote it
+    assert find_completed(journal, task, ws) is None
+
+
+def test_requirements_install_runs_again_when_the_file_changed(tmp_path):
+    ws = str(tmp_path)
+    _write(tmp_path / "requirements.txt", "flask\n")
+    task = {"action": "run_cmd", "target": "pip install -r requirements.txt"}
+    journal = []
+    record(journal, task, "Installed", ws)
+    assert find_completed(journal, task, ws) is not None
+    _write(tmp_path / "requirements.txt", "flask\nrequests\n")
+    assert find_completed(journal, task, ws) is None
+
+
+def test_editable_installs_are_never_skipped(tmp_path):
+    task = {"action": "run_cmd", "target": "pip install -e ."}
+    journal = []
+    record(journal, task, "Installed", str(tmp_path))
+    assert find_completed(journal, task, str(tmp_path)) is None
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from plan_validator import validate_plan, would_have_failed
+
+
+def _resolve(root):
+    return lambda path: os.path.join(root, path)
+
+
+def test_a_folder_does_not_provide_the_script_run_from_it(tmp_path):
+    tasks = [{"action": "mkdir", "target": "app"}, {"action": "run_cmd", "target": "python app/main.py"}]
+    _, _, errors = validate_plan(tasks, _resolve(str(tmp_path)))
+    assert any("app/main.py" in e for e in errors)
+
+
+def test_a_written_script_is_provided(tmp_path):
+    tasks = [{"action": "write_file", "target": "app/main.py", "content": "print(1)"}, {"action": "run_cmd", "target": "python app/main.py"}]
+    _, _, errors = validate_plan(tasks, _resolve(str(tmp_path)))
+    assert errors == []
+
+
+def test_only_repairs_of_failing_steps_save_a_round_trip(tmp_path):
+    tasks = [
+        {"action": "create_file", "target": "a.py", "content": "x"},
+        {"action": "write_file", "target": "b.py", "contents": "y"},
+        {"action": "run_cmd", "target": "python c.py"},
+        {"action": "write_file", "target": "c.py", "content": "z"},
+    ]
+    _, repairs, _ = validate_plan(tasks, _resolve(str(tmp_path)))
+    assert [would_have_failed(r) for r in repairs] == [True, False, True]
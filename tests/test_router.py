@@ -0,0 +1,46 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from mock_ollama import MockOllama, load_scenarios
+from ollama_client import OllamaClient
+from router import ModelRouter
+
+
+def _mocks(*model_lists):
+    mocks = [MockOllama(load_scenarios(), models=models) for models in model_lists]
+    return mocks, [OllamaClient(m.serve(), retries=0) for m in mocks]
+
+
+def test_plans_go_to_a_server_that_has_the_model():
+    mocks, clients = _mocks(("mock",), ("mock", "big"))
+    try:
+        router = ModelRouter(clients)
+        for _ in range(3):
+            result = router.plan({"model": "big", "prompt": "Create a hello world script", "stream": False})
+            assert result["endpoint"] == clients[1].base_url
+        assert mocks[0].requests == 0
+    finally:
+        for m in mocks:
+            m.shutdown()
+
+
+def test_a_missing_model_fails_over_to_the_next_server():
+    mocks, clients = _mocks(("mock",), ("mock", "big"))
+    try:
+        router = ModelRouter(clients)
+        mocks[0].models.append("big")  # the first server's list says it has it...
+        router.endpoints[0].has_model("big")
+        mocks[0].models.remove("big")  # ...but it was removed since
+        response = router.stream({"model": "big", "prompt": "Create a hello world script"})
+        try:
+            assert response.endpoint == clients[1].base_url
+            assert mocks[0].requests == 1
+        finally:
+            response.close()
+        assert router.endpoints[0].healthy()  # a missing model says nothing about the server's health
+    finally:
+        for m in mocks:
+            m.shutdown()
@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from runner import ShellSession
+
+
+def test_session_reports_a_syntax_error_instead_of_hanging(tmp_path):
+    session = ShellSession(str(tmp_path))
+    try:
+        start = time.monotonic()
+        res = session.run('echo "unterminated', timeout=10)
+        assert not res.timed_out and time.monotonic() - start < 5
+        assert res.returncode != 0
+        # The shell is still usable afterwards
+        assert session.run("echo ok", timeout=10).output.strip().endswith("ok")
+    finally:
+        session.close()
+
+
+def test_session_reports_the_status_of_exit(tmp_path):
+    session = ShellSession(str(tmp_path))
+    try:
+        res = session.run("exit 3", timeout=10)
+        assert res.returncode == 3 and not res.timed_out
+        assert session.run("echo back", timeout=10).returncode == 0
+    finally:
+        session.close()
+
+
+def test_session_keeps_cd_and_variables(tmp_path):
+    (tmp_path / "sub").mkdir()
+    session = ShellSession(str(tmp_path))
+    try:
+        session.run("cd sub && export GREETING=hi", timeout=10)
+        res = session.run('echo "$GREETING from $(basename "$PWD")"', timeout=10)
+        assert res.output.strip() == "hi from sub"
+    finally:
+        session.close()
@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fileops import SESSION_STALE_SECONDS, session_workspace
+from scheduler import FairScheduler
+
+
+def test_wait_stats_keep_only_recent_sessions():
+    scheduler = FairScheduler(max_in_flight=1, stats_sessions=3)
+    for session in range(10):
+        scheduler.acquire(session)
+        scheduler.release()
+    assert list(scheduler.snapshot()["waits"]) == ["7", "8", "9"]
+
+
+def test_new_session_removes_long_idle_workspaces(tmp_path):
+    root = str(tmp_path)
+    old, recent = session_workspace("old", root), session_workspace("recent", root)
+    stale = time.time() - SESSION_STALE_SECONDS - 60
+    os.utime(old, (stale, stale))
+    session_workspace("new", root)
+    assert not os.path.exists(old)
+    assert os.path.isdir(recent)
+
+
+def test_reopening_a_session_keeps_it_fresh(tmp_path):
+    root = str(tmp_path)
+    path = session_workspace("s", root)
+    stale = time.time() - SESSION_STALE_SECONDS - 60
+    os.utime(path, (stale, stale))
+    session_workspace("s", root)
+    session_workspace("other", root)
+    assert os.path.isdir(path)
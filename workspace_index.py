@@ -0,0 +1,137 @@
+import os
+import json
+import threading
+
+DEFAULT_IGNORES = {"venv", ".venv", "env", "node_modules", "__pycache__", ".git", ".mypy_cache", ".pytest_cache", ".tox", "dist", "build"}
+INDEX_DIR = ".pocketflow_cache"
+
+
+class WorkspaceIndex:
+    """Persistent listing of the workspace tree, refreshed incrementally from directory mtimes.
+
+    A directory's own mtime changes whenever an entry is added, removed or renamed inside it,
+    so unchanged directories keep their cached listing and cost one `stat` per refresh.
+    Ignored directories (virtualenvs, node_modules, ...) are listed but never descended into.
+    """
+    def __init__(self, root, ignores=DEFAULT_IGNORES, index_path=None):
+        self.root = os.path.abspath(root)
+        self.ignores = set(ignores)
+        self.index_path = index_path or os.path.join(INDEX_DIR, "workspace_index_" + _slug(self.root) + ".json")
+        self.dirs = {}  # relpath -> {"mtime": ..., "subdirs": [...], "ignored": [...], "files": {name: [size, mtime]}}
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+            if data.get("root") == self.root:
+                self.dirs = data.get("dirs", {})
+        except (OSError, ValueError):
+            self.dirs = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"root": self.root, "dirs": self.dirs}, f)
+        os.replace(tmp, self.index_path)
+
+    def _scan_dir(self, rel, abs_path, mtime):
+        entry = {"mtime": mtime, "subdirs": [], "ignored": [], "files": {}}
+        with os.scandir(abs_path) as it:
+            for item in it:
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        (entry["ignored"] if item.name in self.ignores else entry["subdirs"]).append(item.name)
+                    elif item.is_file(follow_symlinks=False):
+                        st = item.stat(follow_symlinks=False)
+                        entry["files"][item.name] = [st.st_size, st.st_mtime]
+                except OSError:
+                    continue
+        entry["subdirs"].sort()
+        entry["ignored"].sort()
+        return entry
+
+    def refresh(self):
+        """Re-lists only the directories whose mtime changed. Returns how many were rescanned."""
+        with self.lock:
+            seen, rescanned = set(), 0
+            stack = ["."]
+            while stack:
+                rel = stack.pop()
+                abs_path = self.root if rel == "." else os.path.join(self.root, rel)
+                try:
+                    mtime = os.stat(abs_path).st_mtime
+                except OSError:
+                    continue
+                seen.add(rel)
+                entry = self.dirs.get(rel)
+                if entry is None or entry["mtime"] != mtime:
+                    try:
+                        entry = self._scan_dir(rel, abs_path, mtime)
+                    except OSError:
+                        continue
+                    self.dirs[rel] = entry
+                    rescanned += 1
+                for name in entry["subdirs"]:
+                    stack.append(name if rel == "." else f"{rel}/{name}")
+
+            for gone in set(self.dirs) - seen:
+                del self.dirs[gone]
+                rescanned += 1
+            if rescanned:
+                self._save()
+            return rescanned
+
+    def listdir(self, rel="."):
+        """Returns (subdirs, ignored_dirs, [(name, size), ...]) for one directory."""
+        entry = self.dirs.get(rel)
+        if entry is None:
+            return [], [], []
+        files = sorted((name, meta[0]) for name, meta in entry["files"].items())
+        return entry["subdirs"], entry["ignored"], files
+
+    def is_empty(self):
+        root = self.dirs.get(".")
+        if root is None:
+            return True
+        visible = {name for name in root["files"] if name != ".gitignore"}
+        return not (visible or root["subdirs"] or root["ignored"])
+
+    def abspath(self, rel_file):
+        path = os.path.abspath(os.path.join(self.root, rel_file))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"'{rel_file}' is outside the workspace")
+        return path
+
+    def reader(self, rel_file):
+        """A zero-argument callable that loads the file's bytes only when a download is requested."""
+        path = self.abspath(rel_file)
+        def load():
+            with open(path, "rb") as f:
+                return f.read()
+        return load
+
+
+def _slug(path):
+    return "".join(c if c.isalnum() else "_" for c in path).strip("_")[-80:]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(root):
+    """One index per workspace root, shared by every rerun in the process."""
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = WorkspaceIndex(root)
+        return _indexes[key]
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024